@@ -1,36 +1,117 @@
+import html
+import logging
+from typing import Final
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+# Статичні частини сторінки збираються один раз при імпорті модуля
+# no-store: сторінка містить OAuth code, її не можна кешувати на CDN
+_HDRS: Final[dict] = {
+    "Content-Type": "text/html; charset=utf-8",
+    "Cache-Control": "no-store"
+}
+
+_PAGE_TPL: Final[str] = "<html><body style='font-family:Arial;'>%s</body></html>"
+
+_ERROR_PREFIX, _ERROR_SUFFIX = (_PAGE_TPL % "<h2>OAuth Error: %s</h2>").split("%s")
+_NO_CODE_HTML: Final[str] = _PAGE_TPL % "<h2>No code provided</h2>"
+_INVALID_REQUEST_HTML: Final[str] = _PAGE_TPL % "<h2>Invalid request</h2>"
+_SUCCESS_TPL: Final[str] = _PAGE_TPL % (
+    "<h2>OAuth success!</h2>"
+    "<p>Code: <b>{code}</b></p>"
+    "<p>State: <b>{state}</b></p>"
+)
+
+# З query string нам потрібні лише ці три ключі
+_WANTED_PARAMS: Final[frozenset] = frozenset(("code", "state", "error"))
+
+
+def _parse_wanted(query_string):
+    """Pick the first code/state/error values, stopping once all three are found"""
+    found = {}
+    # ValueError на задовгому query обробляє handler — це окрема 400, не "No code provided"
+    for key, value in parse_qsl(query_string, max_num_fields=32):
+        if key in _WANTED_PARAMS and key not in found:
+            found[key] = value
+            if len(found) == len(_WANTED_PARAMS):
+                break
+    return found
+
+
+def _first(value):
+    """parse_qs-style mappings hold a list per key - take its first value"""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+
+def _query_of(request):
+    """Return the query mapping for any request shape Vercel may pass in"""
+    # Якщо request це dict — беремо query
+    if isinstance(request, dict):
+        return request.get("query")
+    # Інакше — пробуємо взяти як атрибут (якщо Vercel передав special object)
+    params = getattr(request, "query", None)
+    if params is not None:
+        return params
+    # Flask/Werkzeug вже розпарсили query string — не парсимо вдруге
+    params = getattr(request, "args", None)
+    if params is not None:
+        return params
+    raw = getattr(request, "query_string", None)
+    if raw is None:
+        return None
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    return _parse_wanted(raw)
+
+
+def _response(status_code, body):
+    """Build a Vercel response with a str body and its UTF-8 Content-Length"""
+    # Рантайм серіалізує відповідь у JSON, тому body лишається str; байти потрібні лише для довжини
+    return {
+        "statusCode": status_code,
+        "headers": {**_HDRS, "Content-Length": str(len(body.encode("utf-8")))},
+        "body": body
+    }
+
+
+# Відповідь без коду однакова для всіх запитів — повертаємо той самий dict
+_NO_CODE_RESPONSE: Final[dict] = _response(400, _NO_CODE_HTML)
+_INVALID_REQUEST_RESPONSE: Final[dict] = _response(400, _INVALID_REQUEST_HTML)
+# Тіло 500-ї не містить деталей винятку — вони йдуть лише в лог
+_ERROR_500_RESPONSE: Final[dict] = _response(
+    500, _PAGE_TPL % "<h2>Internal error</h2>"
+)
+
+
 def handler(request):
     try:
-        # Якщо request це dict — беремо query
-        if isinstance(request, dict):
-            params = request.get("query", {})
-        else:
-            # Інакше — пробуємо взяти як атрибут (якщо Vercel передав special object)
-            params = getattr(request, "query", {})
-
-        code = params.get("code")
-        state = params.get("state")
-        error = params.get("error")
+        try:
+            params = _query_of(request) or {}
+        except ValueError:
+            # parse_qsl відкинув query з надто великою кількістю полів
+            logger.warning("oauth_callback: query string has too many fields")
+            return _INVALID_REQUEST_RESPONSE
 
-        body = "<html><body style='font-family:Arial;'>"
+        code = _first(params.get("code"))
+        state = _first(params.get("state"))
+        error = _first(params.get("error"))
 
+        # Значення з query контролює користувач — екрануємо перед вставкою в HTML
         if error:
-            body += f"<h2>OAuth Error: {error}</h2>"
-        elif not code:
-            body += "<h2>No code provided</h2>"
-        else:
-            body += f"<h2>OAuth success!</h2>"
-            body += f"<p>Code: <b>{code}</b></p>"
-            body += f"<p>State: <b>{state}</b></p>"
-
-        body += "</body></html>"
-
-        return {
-            "statusCode": 200,
-            "headers": { "Content-Type": "text/html" },
-            "body": body
-        }
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": f"Error in handler: {str(e)}"
-        }
\ No newline at end of file
+            body = _ERROR_PREFIX + html.escape(error) + _ERROR_SUFFIX
+            return _response(400, body)
+        if not code:
+            return _NO_CODE_RESPONSE
+
+        body = _SUCCESS_TPL.format(
+            code=html.escape(code),
+            state=html.escape(state or "")
+        )
+
+        return _response(200, body)
+    except Exception:
+        logger.exception("oauth_callback failed")
+        return _ERROR_500_RESPONSE
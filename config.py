@@ -131,6 +131,11 @@ MAX_MESSAGE_LENGTH = 4096
 TRANSCRIPTION_DISPLAY_CHUNK_SIZE = 3800
 SUMMARY_DISPLAY_CHUNK_SIZE = 3800
 
+# Streaming summary into a message: min seconds between edits and min new chars per edit
+# (Telegram allows roughly one edit per second per chat)
+SUMMARY_STREAM_EDIT_INTERVAL = 0.8
+SUMMARY_STREAM_BUFFER_THRESHOLD = 24
+
 # Database configuration
 DATABASE_URL = "sqlite+aiosqlite:///./bot_data.db"
 
@@ -151,5 +156,17 @@ GOOGLE_SCOPES = [
 # OAuth state expiration time (minutes)
 OAUTH_STATE_EXPIRY_MINUTES = 10
 
+# How long a calendar connection status is cached in memory (seconds)
+CALENDAR_STATUS_CACHE_TTL_SECONDS = 60
+
+# How long rendered session details/share texts are reused (seconds)
+SESSION_RENDER_CACHE_TTL_SECONDS = 60
+
+# Repeated exchanges of the same OAuth code within this window reuse the first result (seconds)
+OAUTH_EXCHANGE_DEDUP_SECONDS = 60
+
+# Minimum pause between edits of a streamed ChatGPT answer (Telegram rate-limits message edits)
+CHATGPT_STREAM_EDIT_INTERVAL_SECONDS = 1.0
+
 # Encryption key for storing refresh tokens (should be 32 bytes)
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")  # Generate with: import secrets; secrets.token_urlsafe(32)
\ No newline at end of file
@@ -4,45 +4,48 @@ Fix .env file with proper Fernet ENCRYPTION_KEY
 """
 
 import os
-from cryptography.fernet import Fernet
 
 def fix_env_file():
     """Fix .env file with proper Fernet encryption key"""
     
-    # Generate proper Fernet key (base64 encoded)
-    encryption_key = Fernet.generate_key().decode()
-    print(f"✅ Generated Fernet key: {encryption_key}")
-    
     # Read current .env file
     env_path = ".env"
     if not os.path.exists(env_path):
         print("❌ .env file not found! Run setup_env.py first")
         return
     
+    # Generate proper Fernet key (base64 encoded)
+    # cryptography is imported here so the missing-.env path doesn't load OpenSSL
+    from cryptography.fernet import Fernet
+    encryption_key = Fernet.generate_key().decode()
+    print(f"✅ Generated Fernet key: {encryption_key}")
+    
     try:
-        with open(env_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Replace any existing encryption key
-        lines = content.split('\n')
-        new_lines = []
-        encryption_found = False
-        
-        for line in lines:
-            if line.startswith('ENCRYPTION_KEY='):
+        # newline='' keeps the original line endings (CRLF stays CRLF)
+        with open(env_path, 'r+', encoding='utf-8', newline='') as f:
+            # Replace any existing encryption key
+            new_lines = []
+            encryption_found = False
+            
+            for line in f:
+                if line.startswith('ENCRYPTION_KEY='):
+                    encryption_found = True
+                    ending = line[len(line.rstrip('\r\n')):]
+                    new_lines.append(f'ENCRYPTION_KEY={encryption_key}{ending}')
+                    print("✅ Replaced existing ENCRYPTION_KEY")
+                else:
+                    new_lines.append(line)
+            
+            if not encryption_found:
+                if new_lines and not new_lines[-1].endswith('\n'):
+                    new_lines[-1] += '\n'
                 new_lines.append(f'ENCRYPTION_KEY={encryption_key}')
-                encryption_found = True
-                print("✅ Replaced existing ENCRYPTION_KEY")
-            else:
-                new_lines.append(line)
-        
-        if not encryption_found:
-            new_lines.append(f'ENCRYPTION_KEY={encryption_key}')
-            print("✅ Added new ENCRYPTION_KEY")
-        
-        # Write back to file
-        with open(env_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(new_lines))
+                print("✅ Added new ENCRYPTION_KEY")
+            
+            # Write back in place
+            f.seek(0)
+            f.writelines(new_lines)
+            f.truncate()
         
         print("\n✅ .env file updated with proper Fernet ENCRYPTION_KEY!")
         print("\n📋 STATUS:")
@@ -1,15 +1,135 @@
 """
 Handlers for Google Calendar connection and OAuth flow
 """
+import asyncio
+import re
+import secrets
+
 from aiogram import Router, F, types
-from aiogram.filters import Command
+from aiogram.filters import Command, Filter
 from aiogram.fsm.context import FSMContext
 
 from services.google_oauth import google_oauth
 from keyboards.inline import get_calendar_connection_keyboard, get_calendar_disconnect_keyboard
+from states.user_states import CalendarStates
 
 router = Router()
 
+# Authorization code pasted as plain text (only checked while connecting)
+_OAUTH_CODE_MIN_LENGTH = 20
+_OAUTH_CODE_RE = re.compile(r'\A[a-zA-Z0-9/_-]+\Z')
+
+
+class OAuthCodeFilter(Filter):
+    """Match a pasted OAuth code; short or spaced text is rejected before the regex"""
+    
+    async def __call__(self, message: types.Message) -> bool:
+        text = message.text or ""
+        return (
+            len(text) >= _OAUTH_CODE_MIN_LENGTH
+            and " " not in text
+            and _OAUTH_CODE_RE.match(text) is not None
+        )
+
+# Static message bodies
+_ALREADY_CONNECTED = (
+    "✅ <b>Google Calendar уже подключен!</b>\n\n"
+    "📅 Вы можете создавать события в календаре из извлеченных событий сессий.\n\n"
+    "💡 Используйте кнопки ниже для управления подключением:"
+)
+
+_CONNECT_PROMPT_TMPL = (
+    "🔗 <b>Подключение Google Calendar</b>\n\n"
+    "📋 Для подключения календаря:\n"
+    "1️⃣ Нажмите кнопку ниже\n"
+    "2️⃣ Войдите в Google аккаунт\n"
+    "3️⃣ Разрешите доступ к календарю\n"
+    "4️⃣ Скопируйте код авторизации\n"
+    "5️⃣ Отправьте код в этот чат\n\n"
+    "🔐 <b>Код состояния:</b> <code>{state}</code>\n"
+    "💡 <i>Сохраните этот код - он понадобится после авторизации</i>"
+)
+
+_OAUTH_SUCCESS = (
+    "✅ <b>Google Calendar успешно подключен!</b>\n\n"
+    "🎉 Теперь вы можете:\n"
+    "• Создавать события в календаре из сессий\n"
+    "• Автоматически добавлять извлеченные встречи\n"
+    "• Синхронизировать действия с календарем\n\n"
+    "💡 События будут создаваться в вашем основном календаре."
+)
+
+_OAUTH_FAILED = (
+    "❌ Не удалось получить токены доступа.\n\n"
+    "Возможные причины:\n"
+    "• Неверный код авторизации\n"
+    "• Истек срок действия кода\n"
+    "• Проблемы с Google API\n\n"
+    "Попробуйте подключить календарь заново: /connect_calendar"
+)
+
+_DISCONNECT_CONFIRM = (
+    "🔌 <b>Отключение Google Calendar</b>\n\n"
+    "⚠️ После отключения:\n"
+    "• События не будут создаваться автоматически\n"
+    "• Доступ к календарю будет отозван\n"
+    "• Потребуется повторная авторизация для подключения\n\n"
+    "Вы уверены, что хотите отключить календарь?"
+)
+
+# Static keyboards are built once at import time
+_DISCONNECT_CONFIRM_KB = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="❌ Да, отключить", callback_data="confirm_disconnect")],
+    [types.InlineKeyboardButton(text="↩️ Отмена", callback_data="cancel_disconnect")]
+])
+
+_STATUS_CONNECTED = (
+    "✅ <b>Google Calendar подключен</b>\n\n"
+    "📅 Статус: Активен\n"
+    "🔐 Токены: Валидны\n"
+    "⚡ Функции: Доступны\n\n"
+    "💡 Используйте кнопки для управления подключением:"
+)
+
+_STATUS_NOT_CONNECTED = (
+    "❌ <b>Google Calendar не подключен</b>\n\n"
+    "📅 Статус: Не активен\n"
+    "🔐 Токены: Отсутствуют\n"
+    "⚡ Функции: Недоступны\n\n"
+    "🔗 Для подключения используйте: /connect_calendar"
+)
+
+
+async def _complete_oauth(reply, auth_code: str, oauth_state: str, state: FSMContext):
+    """
+    Exchange OAuth code for tokens and report each step via reply
+    (message.answer for the command, callback.message.edit_text for the button)
+    """
+    try:
+        await reply("🔄 Обмениваю код на токены доступа...")
+        
+        tokens = await google_oauth.exchange_code_for_tokens(auth_code, oauth_state)
+        
+        if tokens:
+            await reply(_OAUTH_SUCCESS, reply_markup=get_calendar_disconnect_keyboard())
+            
+            # OAuth flow is finished - drop only its own keys, other flows keep their data
+            data = await state.get_data()
+            data.pop('oauth_state', None)
+            data.pop('pending_oauth', None)
+            await state.set_data(data)
+            if await state.get_state() == CalendarStates.CONNECTING.state:
+                await state.set_state(None)
+            
+        else:
+            await reply(_OAUTH_FAILED)
+    
+    except Exception as e:
+        await reply(
+            f"❌ Ошибка при обработке авторизации: {str(e)}\n\n"
+            "Попробуйте подключить календарь заново: /connect_calendar"
+        )
+
 
 @router.message(Command("connect_calendar"))
 async def cmd_connect_calendar(message: types.Message, state: FSMContext):
@@ -23,32 +143,26 @@ async def cmd_connect_calendar(message: types.Message, state: FSMContext):
     
     if is_connected:
         await message.answer(
-            "✅ <b>Google Calendar уже подключен!</b>\n\n"
-            "📅 Вы можете создавать события в календаре из извлеченных событий сессий.\n\n"
-            "💡 Используйте кнопки ниже для управления подключением:",
+            _ALREADY_CONNECTED,
             reply_markup=get_calendar_disconnect_keyboard()
         )
         return
     
     # Generate OAuth URL
     try:
-        auth_url, state = google_oauth.generate_auth_url(user_id)
+        # Plain-text code detection below only runs in this state; an active flow
+        # (e.g. capture) keeps its state, and the code is sent via /oauth_callback instead
+        if await state.get_state() is None:
+            await state.set_state(CalendarStates.CONNECTING)
+        auth_url, oauth_state_token = google_oauth.generate_auth_url(user_id)
         
         await message.answer(
-            "🔗 <b>Подключение Google Calendar</b>\n\n"
-            "📋 Для подключения календаря:\n"
-            "1️⃣ Нажмите кнопку ниже\n"
-            "2️⃣ Войдите в Google аккаунт\n"
-            "3️⃣ Разрешите доступ к календарю\n"
-            "4️⃣ Скопируйте код авторизации\n"
-            "5️⃣ Отправьте код в этот чат\n\n"
-            f"🔐 <b>Код состояния:</b> <code>{state}</code>\n"
-            "💡 <i>Сохраните этот код - он понадобится после авторизации</i>",
-            reply_markup=get_calendar_connection_keyboard(auth_url, state)
+            _CONNECT_PROMPT_TMPL.format(state=oauth_state_token),
+            reply_markup=get_calendar_connection_keyboard(auth_url, oauth_state_token)
         )
         
         # Store state in FSM for later verification
-        await state.update_data(oauth_state=state)
+        await state.update_data(oauth_state=oauth_state_token)
         
     except Exception as e:
         await message.answer(
@@ -87,45 +201,11 @@ async def cmd_oauth_callback(message: types.Message, state: FSMContext):
         )
         return
     
-    # Exchange code for tokens
-    try:
-        await message.answer("🔄 Обмениваю код на токены доступа...")
-        
-        tokens = await google_oauth.exchange_code_for_tokens(auth_code, oauth_state)
-        
-        if tokens:
-            await message.answer(
-                "✅ <b>Google Calendar успешно подключен!</b>\n\n"
-                "🎉 Теперь вы можете:\n"
-                "• Создавать события в календаре из сессий\n"
-                "• Автоматически добавлять извлеченные встречи\n"
-                "• Синхронизировать действия с календарем\n\n"
-                "💡 События будут создаваться в вашем основном календаре.",
-                reply_markup=get_calendar_disconnect_keyboard()
-            )
-            
-            # Clear OAuth state from FSM
-            await state.update_data(oauth_state=None)
-            
-        else:
-            await message.answer(
-                "❌ Не удалось получить токены доступа.\n\n"
-                "Возможные причины:\n"
-                "• Неверный код авторизации\n"
-                "• Истек срок действия кода\n"
-                "• Проблемы с Google API\n\n"
-                "Попробуйте подключить календарь заново: /connect_calendar"
-            )
-    
-    except Exception as e:
-        await message.answer(
-            f"❌ Ошибка при обработке авторизации: {str(e)}\n\n"
-            "Попробуйте подключить календарь заново: /connect_calendar"
-        )
+    await _complete_oauth(message.answer, auth_code, oauth_state, state)
 
 
 # Alternative handler for users who send just the code without command
-@router.message(F.text.regexp(r'^[a-zA-Z0-9/_-]{20,}$'))
+@router.message(CalendarStates.CONNECTING, OAuthCodeFilter())
 async def handle_oauth_code(message: types.Message, state: FSMContext):
     """
     Handle OAuth authorization code sent as plain text
@@ -140,6 +220,11 @@ async def handle_oauth_code(message: types.Message, state: FSMContext):
     
     auth_code = message.text.strip()
     
+    # callback_data is limited to 64 bytes, so the code stays in FSM
+    # and the button carries only a short nonce
+    nonce = secrets.token_urlsafe(8)
+    await state.update_data(pending_oauth={nonce: [auth_code, stored_state]})
+    
     await message.answer(
         f"🔍 Обнаружен код авторизации!\n\n"
         f"Если это код от Google, отправьте его в формате:\n"
@@ -148,7 +233,7 @@ async def handle_oauth_code(message: types.Message, state: FSMContext):
         reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[
             [types.InlineKeyboardButton(
                 text="✅ Обработать код", 
-                callback_data=f"process_oauth_{auth_code}_{stored_state}"
+                callback_data=f"process_oauth_{nonce}"
             )],
             [types.InlineKeyboardButton(
                 text="❌ Это не код Google", 
@@ -163,70 +248,32 @@ async def cq_process_oauth_code(callback: types.CallbackQuery, state: FSMContext
     """Process OAuth code from callback"""
     await callback.answer()
     
-    data_parts = callback.data.split("_", 3)
-    if len(data_parts) < 4:
+    nonce = callback.data.removeprefix("process_oauth_")
+    data = await state.get_data()
+    pending = data.get('pending_oauth') or {}
+    if nonce not in pending:
         await callback.message.edit_text("❌ Неверные данные авторизации.")
         return
     
-    auth_code = data_parts[2]
-    oauth_state = data_parts[3]
+    # The nonce stays until the exchange succeeds (_complete_oauth drops it):
+    # a repeated click reaches exchange_code_for_tokens and gets its cached result
+    auth_code, oauth_state = pending[nonce]
     
-    # Process like the command handler
-    try:
-        await callback.message.edit_text("🔄 Обмениваю код на токены доступа...")
-        
-        tokens = await google_oauth.exchange_code_for_tokens(auth_code, oauth_state)
-        
-        if tokens:
-            await callback.message.edit_text(
-                "✅ <b>Google Calendar успешно подключен!</b>\n\n"
-                "🎉 Теперь вы можете:\n"
-                "• Создавать события в календаре из сессий\n"
-                "• Автоматически добавлять извлеченные встречи\n"
-                "• Синхронизировать действия с календарем\n\n"
-                "💡 События будут создаваться в вашем основном календаре.",
-                reply_markup=get_calendar_disconnect_keyboard()
-            )
-            
-            # Clear OAuth state from FSM
-            await state.update_data(oauth_state=None)
-            
-        else:
-            await callback.message.edit_text(
-                "❌ Не удалось получить токены доступа.\n\n"
-                "Попробуйте подключить календарь заново: /connect_calendar"
-            )
-    
-    except Exception as e:
-        await callback.message.edit_text(
-            f"❌ Ошибка при обработке авторизации: {str(e)}\n\n"
-            "Попробуйте подключить календарь заново: /connect_calendar"
-        )
+    await _complete_oauth(callback.message.edit_text, auth_code, oauth_state, state)
 
 
 @router.callback_query(F.data == "ignore_oauth_code")
 async def cq_ignore_oauth_code(callback: types.CallbackQuery, state: FSMContext):
     """Ignore the OAuth code detection"""
-    await callback.answer()
-    await callback.message.delete()
+    await asyncio.gather(callback.answer(), callback.message.delete())
 
 
 @router.callback_query(F.data == "disconnect_calendar")
 async def cq_disconnect_calendar(callback: types.CallbackQuery, state: FSMContext):
     """Handle calendar disconnection request"""
-    await callback.answer()
-    
-    await callback.message.edit_text(
-        "🔌 <b>Отключение Google Calendar</b>\n\n"
-        "⚠️ После отключения:\n"
-        "• События не будут создаваться автоматически\n"
-        "• Доступ к календарю будет отозван\n"
-        "• Потребуется повторная авторизация для подключения\n\n"
-        "Вы уверены, что хотите отключить календарь?",
-        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[
-            [types.InlineKeyboardButton(text="❌ Да, отключить", callback_data="confirm_disconnect")],
-            [types.InlineKeyboardButton(text="↩️ Отмена", callback_data="cancel_disconnect")]
-        ])
+    await asyncio.gather(
+        callback.answer(),
+        callback.message.edit_text(_DISCONNECT_CONFIRM, reply_markup=_DISCONNECT_CONFIRM_KB)
     )
 
 
@@ -261,12 +308,13 @@ async def cq_confirm_disconnect(callback: types.CallbackQuery, state: FSMContext
 @router.callback_query(F.data == "cancel_disconnect")
 async def cq_cancel_disconnect(callback: types.CallbackQuery, state: FSMContext):
     """Cancel calendar disconnection"""
-    await callback.answer()
-    
-    await callback.message.edit_text(
-        "✅ Google Calendar остается подключенным.\n\n"
-        "📅 Вы можете создавать события в календаре из извлеченных событий сессий.",
-        reply_markup=get_calendar_disconnect_keyboard()
+    await asyncio.gather(
+        callback.answer(),
+        callback.message.edit_text(
+            "✅ Google Calendar остается подключенным.\n\n"
+            "📅 Вы можете создавать события в календаре из извлеченных событий сессий.",
+            reply_markup=get_calendar_disconnect_keyboard()
+        )
     )
 
 
@@ -282,21 +330,11 @@ async def cmd_calendar_status(message: types.Message, state: FSMContext):
         
         if is_connected:
             await message.answer(
-                "✅ <b>Google Calendar подключен</b>\n\n"
-                "📅 Статус: Активен\n"
-                "🔐 Токены: Валидны\n"
-                "⚡ Функции: Доступны\n\n"
-                "💡 Используйте кнопки для управления подключением:",
+                _STATUS_CONNECTED,
                 reply_markup=get_calendar_disconnect_keyboard()
             )
         else:
-            await message.answer(
-                "❌ <b>Google Calendar не подключен</b>\n\n"
-                "📅 Статус: Не активен\n"
-                "🔐 Токены: Отсутствуют\n"
-                "⚡ Функции: Недоступны\n\n"
-                "🔗 Для подключения используйте: /connect_calendar"
-            )
+            await message.answer(_STATUS_NOT_CONNECTED)
     
     except Exception as e:
         await message.answer(
@@ -2,17 +2,82 @@
 Capture Chat Command Handler - NEW FEATURE
 Handles /capture_chat command without breaking existing structure
 """
+import asyncio
 import logging
+import time
 from aiogram import Router, types, F
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from config import (
+    SUMMARY_DISPLAY_CHUNK_SIZE,
+    SUMMARY_STREAM_EDIT_INTERVAL,
+    SUMMARY_STREAM_BUFFER_THRESHOLD
+)
+from services.analysis import gpt_analysis
+from services.event_extraction import extract_events_from_text
 from states.user_states import CaptureStates
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Static message bodies
+_CAPTURE_PROMPT = (
+    "📝 **РЕЖИМ ЗАХОПЛЕННЯ ПЕРЕПИСКИ**\n\n"
+    "🎯 **Що робити:**\n"
+    "• Надішліть текст переписки або розмови\n"
+    "• Я проаналізую її та знайду події\n"
+    "• Створю summary та витягну всі зустрічі\n\n"
+    "⚡️ **Очікую ваш текст...**"
+)
+
+_CAPTURE_CANCELLED = (
+    "❌ **Режим захоплення відмінено**\n\n"
+    "Використайте /capture_chat щоб почати знову."
+)
+
+_EVENT_CARD_TMPL = (
+    "📅 **Подія {number}: {title}**\n"
+    "🗓 Дата: {date}\n"
+    "⏰ Час: {time}\n"
+    "📍 Місце: {location}\n"
+    "⏳ Тривалість: {duration}\n"
+    "💰 Оплата: {payment}\n"
+    "🔹 Інше: {notes}"
+)
+
+_EVENT_CARD_DEFAULTS = {
+    'title': 'Без назви',
+    'date': 'Не вказана',
+    'time': 'Не вказаний',
+    'location': 'Не вказане',
+    'duration': 'Не вказана',
+    'payment': 'Не вказана',
+    'notes': 'Немає',
+}
+
+
+class _EventDefaults(dict):
+    """Event dict that falls back to card defaults for missing fields"""
+    
+    def __missing__(self, key):
+        return _EVENT_CARD_DEFAULTS[key]
+
+
+# Static keyboards are built once at import time
+_CANCEL_CAPTURE_KB = types.InlineKeyboardMarkup(inline_keyboard=[
+    [types.InlineKeyboardButton(text="❌ Відмінити", callback_data="cancel_capture")]
+])
+
+_PROGRESS_TEXT = (
+    "🔍 **Аналізую переписку...**\n\n"
+    "⏳ Створюю summary...\n"
+    "📅 Шукаю події та зустрічі...\n"
+    "🔄 Зачекайте кілька секунд..."
+)
+
 
 @router.message(Command("capture_chat"))
 async def cmd_capture_chat(message: types.Message, state: FSMContext):
@@ -24,29 +89,18 @@ async def cmd_capture_chat(message: types.Message, state: FSMContext):
         return
     
     user_id = message.from_user.id
-    logger.info(f"🎯 /capture_chat command called by user {user_id}")
+    logger.info("🎯 /capture_chat command called by user %s", user_id)
     
     try:
         # Set FSM state to wait for conversation text
         await state.set_state(CaptureStates.CAPTURING)
         
-        # Create keyboard with cancel option
-        keyboard = create_capture_waiting_keyboard()
-        
-        await message.answer(
-            "📝 **РЕЖИМ ЗАХОПЛЕННЯ ПЕРЕПИСКИ**\n\n"
-            "🎯 **Що робити:**\n"
-            "• Надішліть текст переписки або розмови\n"
-            "• Я проаналізую її та знайду події\n"
-            "• Створю summary та витягну всі зустрічі\n\n"
-            "⚡️ **Очікую ваш текст...**",
-            reply_markup=keyboard
-        )
+        await message.answer(_CAPTURE_PROMPT, reply_markup=_CANCEL_CAPTURE_KB)
         
-        logger.info(f"✅ Capture chat mode activated for user {user_id}")
+        logger.info("✅ Capture chat mode activated for user %s", user_id)
         
     except Exception as e:
-        logger.error(f"❌ Capture chat command failed for user {user_id}: {e}")
+        logger.exception("❌ Capture chat command failed for user %s", user_id)
         await message.answer(
             "❌ **Помилка команди /capture_chat**\n\n"
             f"Не вдалося запустити режим захоплення: {str(e)}\n\n"
@@ -54,7 +108,8 @@ async def cmd_capture_chat(message: types.Message, state: FSMContext):
         )
 
 
-@router.message(CaptureStates.CAPTURING, F.content_type == 'text', ~F.text.startswith('/'))
+# Cheap content checks go before the FSM state check
+@router.message(F.content_type == 'text', ~F.text.startswith('/'), CaptureStates.CAPTURING)
 async def handle_capture_text_input(message: types.Message, state: FSMContext):
     """Handle text input in capture mode (exclude commands)"""
     if not message.from_user or not message.text:
@@ -63,13 +118,13 @@ async def handle_capture_text_input(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     text_input = message.text
     
-    logger.info(f"📝 Received capture text from user {user_id}, length: {len(text_input)}")
+    logger.info("📝 Received capture text from user %s, length: %d", user_id, len(text_input))
     
     try:
         await process_capture_request(message, text_input, state)
         
     except Exception as e:
-        logger.error(f"❌ Capture text processing failed for user {user_id}: {e}")
+        logger.exception("❌ Capture text processing failed for user %s", user_id)
         await message.answer(
             "❌ **Помилка обробки переписки**\n\n"
             f"Не вдалося проаналізувати текст: {str(e)}\n\n"
@@ -78,7 +133,7 @@ async def handle_capture_text_input(message: types.Message, state: FSMContext):
 
 
 # Handle commands in capture mode
-@router.message(CaptureStates.CAPTURING, F.text.startswith('/'))
+@router.message(F.text.startswith('/'), CaptureStates.CAPTURING)
 async def handle_commands_in_capture_mode(message: types.Message, state: FSMContext):
     """Handle commands when in capture waiting state"""
     if not message.from_user or not message.text:
@@ -87,10 +142,7 @@ async def handle_commands_in_capture_mode(message: types.Message, state: FSMCont
     command = message.text.lower()
     if command in ['/cancel', '/start']:
         await state.clear()
-        await message.answer(
-            "❌ **Режим захоплення відмінено**\n\n"
-            "Використайте /capture_chat щоб почати знову."
-        )
+        await message.answer(_CAPTURE_CANCELLED)
     else:
         await message.answer(
             "⚠️ **Ви в режимі захоплення переписки**\n\n"
@@ -115,34 +167,29 @@ async def process_capture_request(message: types.Message, input_text: str, state
         return
     
     # Show progress
-    progress_message = await message.answer(
-        "🔍 **Аналізую переписку...**\n\n"
-        "⏳ Створюю summary...\n"
-        "📅 Шукаю події та зустрічі...\n"
-        "🔄 Зачекайте кілька секунд..."
-    )
+    progress_message = await message.answer(_PROGRESS_TEXT)
     
     try:
         # Clear FSM state
         await state.clear()
         
-        # Import existing services to use current functionality
-        from services.analysis import GPTAnalysisService
-        from services.event_extractor_new import EventExtractorService
-        
-        # 1. Generate summary (existing functionality)
-        gpt_service = GPTAnalysisService()
-        summary = await gpt_service.generate_summary_only(input_text)
+        # Summary and event extraction are independent - run them concurrently;
+        # the summary is streamed into the progress message as it arrives
+        summary, events = await asyncio.gather(
+            stream_summary_to_message(progress_message, input_text),
+            extract_events_from_text(input_text),
+            return_exceptions=True
+        )
         
-        # 2. Extract events (NEW functionality)
-        extractor = EventExtractorService()
-        events = await extractor.extract_events(input_text)
-        
-        # Delete progress message
-        try:
-            await progress_message.delete()
-        except:
-            pass
+        # One failed call should not hide the other's result
+        if isinstance(summary, Exception) and isinstance(events, Exception):
+            raise summary
+        if isinstance(summary, Exception):
+            logger.error("Summary generation failed for user %s: %s", user_id, summary)
+            summary = "⚠️ Не вдалося створити summary"
+        if isinstance(events, Exception):
+            logger.error("Event extraction failed for user %s: %s", user_id, events)
+            events = []
         
         # Send summary first
         summary_text = (
@@ -151,51 +198,93 @@ async def process_capture_request(message: types.Message, input_text: str, state
             f"📊 **Статистика:** {len(input_text)} символів проаналізовано"
         )
         
-        await message.answer(summary_text)
-        
-        # Send events if found
+        parts = [summary_text]
         if events:
-            for event in events:
-                await send_event_card(message, event)
+            parts.extend(
+                format_event_card(event, number)
+                for number, event in enumerate(events, 1)
+            )
         else:
-            await message.answer(
+            parts.append(
                 "ℹ️ **Події не знайдено**\n\n"
                 "У переписці немає згадок про зустрічі або події."
             )
         
-        logger.info(f"✅ Capture completed for user {user_id}: {len(events)} events found")
+        # Summary and event cards go out in as few messages as possible;
+        # event buttons are attached to the last one. The progress message
+        # is turned into the first chunk instead of delete + send
+        chunks = pack_message_parts(parts, SUMMARY_DISPLAY_CHUNK_SIZE)
+        keyboard = create_events_keyboard(events)
+        for i, chunk in enumerate(chunks):
+            markup = keyboard if i == len(chunks) - 1 else None
+            if i == 0:
+                await progress_message.edit_text(chunk, reply_markup=markup)
+            else:
+                await message.answer(chunk, reply_markup=markup)
         
-    except Exception as e:
-        logger.error(f"❌ Capture processing failed for user {user_id}: {e}")
+        logger.info("✅ Capture completed for user %s: %d events found", user_id, len(events))
         
-        # Delete progress message
-        try:
-            await progress_message.delete()
-        except:
-            pass
+    except Exception as e:
+        logger.exception("❌ Capture processing failed for user %s", user_id)
         
-        await message.answer(
+        await progress_message.edit_text(
             "❌ **Помилка аналізу переписки**\n\n"
             f"Не вдалося проаналізувати текст: {str(e)}\n\n"
             "🔄 Спробуйте ще раз або зверніться до адміністратора"
         )
 
 
-async def send_event_card(message: types.Message, event: dict):
-    """Send formatted event card with action buttons"""
-    event_text = (
-        f"📅 **Подія: {event.get('title', 'Без назви')}**\n"
-        f"🗓 Дата: {event.get('date', 'Не вказана')}\n"
-        f"⏰ Час: {event.get('time', 'Не вказаний')}\n"
-        f"📍 Місце: {event.get('location', 'Не вказане')}\n"
-        f"⏳ Тривалість: {event.get('duration', 'Не вказана')}\n"
-        f"💰 Оплата: {event.get('payment', 'Не вказана')}\n"
-        f"🔹 Інше: {event.get('notes', 'Немає')}"
-    )
+async def stream_summary_to_message(progress_message: types.Message, input_text: str) -> str:
+    """Stream summary into progress_message with throttled edits; returns the full summary"""
+    summary = ""
+    shown_length = 0
+    last_edit = time.monotonic()
+    
+    async for piece in gpt_analysis.stream_summary(input_text):
+        summary += piece
+        now = time.monotonic()
+        if (len(summary) - shown_length < SUMMARY_STREAM_BUFFER_THRESHOLD
+                or now - last_edit < SUMMARY_STREAM_EDIT_INTERVAL):
+            continue
+        
+        last_edit = now
+        try:
+            await progress_message.edit_text(summary[:SUMMARY_DISPLAY_CHUNK_SIZE] + " ▌")
+            shown_length = len(summary)
+        except TelegramRetryAfter as e:
+            # Flood limit hit - hold off further edits until Telegram allows them
+            last_edit = now + e.retry_after
+        except TelegramBadRequest:
+            # Partial text may not parse (e.g. unclosed markup) - wait for more
+            pass
+    
+    return summary.strip()
+
+
+def format_event_card(event: dict, number: int) -> str:
+    """Format event card text; number matches the event's buttons row"""
+    return _EVENT_CARD_TMPL.format_map(_EventDefaults(event, number=number))
+
+
+def pack_message_parts(parts: list, limit: int) -> list:
+    """Greedily join text parts into as few messages as fit under limit"""
+    separator = "\n\n---\n\n"
+    chunks = []
+    current = ""
+    
+    for part in parts:
+        if not current:
+            current = part
+        elif len(current) + len(separator) + len(part) <= limit:
+            current += separator + part
+        else:
+            chunks.append(current)
+            current = part
     
-    keyboard = create_event_card_keyboard(event.get('id', ''))
+    if current:
+        chunks.append(current)
     
-    await message.answer(event_text, reply_markup=keyboard)
+    return chunks
 
 
 # ==============================================
@@ -208,11 +297,13 @@ async def cq_cancel_capture(callback: types.CallbackQuery, state: FSMContext):
     await state.clear()
     
     if callback.message:
-        await callback.message.edit_text(
-            "❌ **Режим захоплення відмінено**\n\n"
-            "Використайте /capture_chat щоб почати знову."
+        # answer() and the edit don't depend on each other - send both at once
+        await asyncio.gather(
+            callback.answer(),
+            callback.message.edit_text(_CAPTURE_CANCELLED)
         )
-    await callback.answer()
+    else:
+        await callback.answer()
 
 
 @router.callback_query(F.data.startswith("event_add_"))
@@ -248,32 +339,45 @@ async def cq_edit_event(callback: types.CallbackQuery):
 async def cq_cancel_event(callback: types.CallbackQuery):
     """Cancel/dismiss event"""
     if callback.message:
-        await callback.message.edit_text(
-            "❌ **Подію відмінено**\n\n"
-            "Використайте /capture_chat для нового аналізу."
-        )
-    await callback.answer()
+        # Several events share one message: drop only this event's buttons row
+        markup = callback.message.reply_markup
+        rows = [
+            row for row in (markup.inline_keyboard if markup else [])
+            if not any(button.callback_data == callback.data for button in row)
+        ]
+        
+        if rows:
+            edit = callback.message.edit_reply_markup(
+                reply_markup=types.InlineKeyboardMarkup(inline_keyboard=rows)
+            )
+        else:
+            edit = callback.message.edit_text(
+                "❌ **Подію відмінено**\n\n"
+                "Використайте /capture_chat для нового аналізу."
+            )
+        await asyncio.gather(callback.answer(), edit)
+    else:
+        await callback.answer()
 
 
 # ==============================================
 # HELPER FUNCTIONS
 # ==============================================
 
-def create_capture_waiting_keyboard():
-    """Create keyboard for waiting for text input"""
-    builder = InlineKeyboardBuilder()
-    builder.button(text="❌ Відмінити", callback_data="cancel_capture")
+def create_events_keyboard(events: list):
+    """Create one keyboard with a buttons row per event card (None if there are no events)"""
+    if not events:
+        return None
     
-    return builder.as_markup()
-
-
-def create_event_card_keyboard(event_id: str):
-    """Create keyboard for event card"""
     builder = InlineKeyboardBuilder()
-    builder.button(text="✅ Додати у Calendar", callback_data=f"event_add_{event_id}")
-    builder.button(text="✏️ Редагувати", callback_data=f"event_edit_{event_id}")
-    builder.button(text="❌ Відмінити", callback_data=f"event_cancel_{event_id}")
+    for number, event in enumerate(events, 1):
+        # Витягнуті події ще не збережені й не мають id — тоді ключем є номер картки,
+        # він унікальний у межах повідомлення, тож cq_cancel_event прибирає саме цей ряд
+        key = event.get('id') or f"n{number}"
+        builder.button(text=f"✅ {number} у Calendar", callback_data=f"event_add_{key}")
+        builder.button(text=f"✏️ {number}", callback_data=f"event_edit_{key}")
+        builder.button(text=f"❌ {number}", callback_data=f"event_cancel_{key}")
     
-    builder.adjust(1)  # Each button on a new line
+    builder.adjust(3)  # One row per event
     
-    return builder.as_markup() 
\ No newline at end of file
+    return builder.as_markup()
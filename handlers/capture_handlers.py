@@ -1,20 +1,185 @@
 """
 Handlers for conversation capture session commands
 """
+import asyncio
+import csv
+import hashlib
+import io
+import logging
+import re
+import time
+from typing import Dict, Optional
+
 from aiogram import Router, F, types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
+from aiogram.types import BufferedInputFile
+import orjson
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 
 from states.user_states import CaptureStates
 from services.session_manager import session_manager
 from services.analysis import gpt_analysis
-from services.database import CaptureSession, Event
-from keyboards.inline import get_capture_session_keyboard, get_sessions_pagination_keyboard
+from services.database import (
+    CaptureSession, Event,
+    get_session_events, get_session_events_with_calendar, get_session_with_events,
+    get_user_sessions_paginated, get_user_stats, invalidate_session_events
+)
+from keyboards.inline import (
+    get_capture_session_keyboard, get_sessions_pagination_keyboard, get_calendar_sync_keyboard,
+    get_session_actions_keyboard, get_export_format_keyboard, get_delete_confirm_keyboard,
+    get_event_confirmation_keyboard
+)
 from services.google_calendar import google_calendar
 from services.google_oauth import google_oauth
+from config import SESSION_RENDER_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
+# Таблиці для рендерингу подій — не змінюються, тож будуються один раз
+_PRIO_RANK = {"high": 0, "medium": 1, "low": 2}
+_TYPE_RANK = {"deadline": 0, "meeting": 1, "task": 2, "appointment": 3, "reminder": 4}
+_PRIO_EMOJI = {"high": "🔴", "medium": "🟡", "low": "🟢"}
+_TYPE_EMOJI = {
+    "meeting": "🤝", "deadline": "⏰", "task": "📋",
+    "appointment": "📅", "reminder": "🔔"
+}
+# Варіант типів для карток сесій, експорту та шерингу
+_SESSION_TYPE_EMOJI = {
+    'meeting': '👥', 'deadline': '⏰', 'task': '✅',
+    'appointment': '📅', 'reminder': '💭'
+}
+# Готові префікси "тип пріоритет" для всіх відомих пар — один lookup на подію
+_SESSION_EVENT_PREFIX = {
+    (t, p): f"{te} {pe}"
+    for t, te in _SESSION_TYPE_EMOJI.items()
+    for p, pe in _PRIO_EMOJI.items()
+}
+_STATUS_EMOJI = {'completed': '✅', 'active': '🔄', 'failed': '❌'}
+_TYPE_NAME_RU = {
+    "meeting": "встреча", "deadline": "дедлайн", "task": "задача",
+    "appointment": "встреча", "reminder": "напоминание"
+}
+_PRIO_NAME_RU = {"high": "высокий", "medium": "средний", "low": "низкий"}
+
+# Картка однієї події у результатах аналізу; порожні рядки передаються як ""
+_EVENT_TMPL = "\n{idx}. {prio_e}{type_e} <b>{title}</b>\n{date_line}{loc_line}{part_line}{items_block}{meta_line}"
+
+# Екран підтвердження подій: рядок події та незмінна підказка внизу
+_EVENT_ROW_TMPL = " {i}. {pe}{te} <b>{title}</b>\n"
+_CONFIRM_FOOTER = (
+    "💡 <b>Управление:</b>\n"
+    "• Нажмите на номер события чтобы включить/исключить\n"
+    "• Используйте кнопки для массовых операций\n"
+)
+
+# /my_sessions [page] [status] [search] — розбір аргументів за один прохід
+_MY_SESSIONS_RE = re.compile(
+    r'^/my_sessions(?:@\w+)?'
+    r'(?:\s+(?P<page>\d+))?'
+    r'(?:\s+(?P<status>completed|active|failed))?'
+    r'(?:\s+(?P<q>.+))?$'
+)
+
+# Відрендерені тексти сесій: (kind, session_id, user_id) -> (text, cached_at)
+_session_render_cache: Dict[tuple, tuple] = {}
+# Сесії в цих статусах більше не змінюються, тож їх можна кешувати
+_FINAL_SESSION_STATUSES = ('completed', 'failed')
+
+
+def _get_cached_render(kind: str, session_id: int, user_id: int) -> Optional[str]:
+    """Return a still-fresh rendered text for the session, or None"""
+    entry = _session_render_cache.get((kind, session_id, user_id))
+    if entry and time.monotonic() - entry[1] < SESSION_RENDER_CACHE_TTL_SECONDS:
+        return entry[0]
+    return None
+
+
+def _store_render(kind: str, session, user_id: int, text: str):
+    """Remember rendered text for a session that can no longer change"""
+    if session.status not in _FINAL_SESSION_STATUSES:
+        return
+    now = time.monotonic()
+    if len(_session_render_cache) >= 1000:
+        for key in [k for k, (_, ts) in _session_render_cache.items() if now - ts >= SESSION_RENDER_CACHE_TTL_SECONDS]:
+            del _session_render_cache[key]
+    _session_render_cache[(kind, session.id, user_id)] = (text, now)
+
+
+def invalidate_session_render(session_id: int):
+    """Drop every cached rendering of the session"""
+    for key in [k for k in _session_render_cache if k[1] == session_id]:
+        del _session_render_cache[key]
+
+
+# Розбір callback_data: один скомпільований шаблон на кожен префікс
+_CB_PATTERNS = {
+    'sessions_page': re.compile(r'sessions_page_(\d+)(?:_([a-z]+))?(?:_(.+))?\Z', re.S),
+    'export_session': re.compile(r'export_session_(\d+)_(\w+)'),
+    'export_format': re.compile(r'export_format_(\d+)_(\w+)'),
+    'share_session': re.compile(r'share_session_(\d+)_(\w+)'),
+    'sync_calendar': re.compile(r'sync_calendar_(\d+)'),
+    'delete_session': re.compile(r'delete_session_(\d+)'),
+    'confirm_delete': re.compile(r'confirm_delete_(\d+)'),
+    'cancel_delete': re.compile(r'cancel_delete_(\d+)'),
+    'toggle_event': re.compile(r'toggle_event_(\d+)_(\d+)'),
+    'select_all_events': re.compile(r'select_all_events_(\d+)'),
+    'deselect_all_events': re.compile(r'deselect_all_events_(\d+)'),
+    'confirm_create_events': re.compile(r'confirm_create_events_(\d+)'),
+}
+
+
+# Теги, які прибираємо, якщо Telegram не прийняв HTML-розмітку
+_TG_HTML_TAG_RE = re.compile(r'</?(?:b|i|code|pre)>')
+# Ті самі теги з розбором на (/, ім'я) — для перенесення відкритих тегів між частинами
+_TG_HTML_TAG_SPLIT_RE = re.compile(r'<(/?)(b|i|code|pre)>')
+_HTML_TAG_RESERVE = 32
+
+
+def _session_event_prefix(event) -> str:
+    """Type and priority emoji for an event in session cards, exports and shares"""
+    prefix = _SESSION_EVENT_PREFIX.get((event.event_type, event.priority))
+    if prefix is None:
+        # Невідомий тип чи пріоритет — складаємо з дефолтами як раніше
+        prefix = f"{_SESSION_TYPE_EMOJI.get(event.event_type, '📝')} {_PRIO_EMOJI.get(event.priority, '⚪')}"
+    return prefix
+
+
+def _fmt_dt(dt) -> str:
+    """dd.mm.YYYY HH:MM without going through strftime"""
+    return f"{dt.day:02d}.{dt.month:02d}.{dt.year:04d} {dt.hour:02d}:{dt.minute:02d}"
+
+
+def _fmt_dt_short(dt) -> str:
+    """dd.mm HH:MM without going through strftime"""
+    return f"{dt.day:02d}.{dt.month:02d} {dt.hour:02d}:{dt.minute:02d}"
+
+
+def _dedupe_events(events: list) -> list:
+    """Drop events repeating an earlier (title, date, time), keeping the first occurrence"""
+    seen = set()
+    unique = []
+    for event in events or []:
+        key = (str(event.get('title', '')).strip().lower(), event.get('date'), event.get('time'))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(event)
+    return unique
+
+
+def _event_sort_key(event: dict) -> tuple:
+    """Sort events by priority, then by type"""
+    return (
+        _PRIO_RANK.get(event.get("priority", "medium"), 1),
+        _TYPE_RANK.get(event.get("type", "event"), 5)
+    )
+
 
 @router.message(Command("capture_chat"))
 async def cmd_capture_chat(message: types.Message, state: FSMContext):
@@ -82,10 +247,59 @@ async def cq_cancel_capture(callback: types.CallbackQuery, state: FSMContext):
     
     text = "✅ Сессия захвата отменена." if success else "❌ Ошибка при отмене сессии."
     
+    await _edit_or_answer(callback.message, text)
+
+
+async def _retry_after(make_call):
+    """Run a Telegram API call, waiting out one flood-control RetryAfter before retrying"""
     try:
-        await callback.message.edit_text(text)
-    except Exception:
-        await callback.message.answer(text)
+        return await make_call()
+    except TelegramRetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        return await make_call()
+
+
+async def _edit_or_answer(message: types.Message, text: str, edit: bool = True):
+    """Edit the message in place when asked to, otherwise (or if editing fails) send a new one"""
+    if edit:
+        try:
+            await _retry_after(lambda: message.edit_text(text))
+            return
+        except TelegramBadRequest:
+            pass
+    await _retry_after(lambda: message.answer(text))
+
+
+class ProgressThrottler:
+    """
+    Edits a status message at most once per min_interval seconds.
+    Updates arriving sooner are held back; only the latest one is kept for the next edit.
+    """
+    
+    def __init__(self, message: types.Message, min_interval: float = 1.0):
+        self.message = message
+        self.min_interval = min_interval
+        self._last_edit = 0.0
+        self._last_text = None
+        self._pending = None
+    
+    async def update(self, text: str):
+        """Show text now if the interval has passed, otherwise keep it for flush()"""
+        self._pending = text
+        if time.monotonic() - self._last_edit >= self.min_interval:
+            await self.flush()
+    
+    async def flush(self):
+        """Send the latest held-back text, if it differs from what is shown"""
+        text, self._pending = self._pending, None
+        if text is None or text == self._last_text:
+            return
+        self._last_edit = time.monotonic()
+        self._last_text = text
+        try:
+            await self.message.edit_text(text)
+        except TelegramBadRequest as e:
+            logger.debug("Progress edit skipped: %s", e)
 
 
 @router.message(Command("end_capture"))
@@ -106,13 +320,7 @@ async def end_capture_session(message: types.Message, state: FSMContext, edit_me
     current_state = await state.get_state()
     if current_state != CaptureStates.CAPTURING:
         text = "❌ У вас нет активной сессии захвата."
-        if edit_message:
-            try:
-                await message.edit_text(text)
-            except Exception:
-                await message.answer(text)
-        else:
-            await message.answer(text)
+        await _edit_or_answer(message, text, edit_message)
         return
     
     # End the session
@@ -120,13 +328,7 @@ async def end_capture_session(message: types.Message, state: FSMContext, edit_me
     
     if not session:
         text = "❌ Ошибка при завершении сессии."
-        if edit_message:
-            try:
-                await message.edit_text(text)
-            except Exception:
-                await message.answer(text)
-        else:
-            await message.answer(text)
+        await _edit_or_answer(message, text, edit_message)
         return
     
     # Show session summary
@@ -152,13 +354,7 @@ async def end_capture_session(message: types.Message, state: FSMContext, edit_me
         # Trigger GPT analysis
         await process_session_with_gpt(user_id, state, session, message)
     
-    if edit_message:
-        try:
-            await message.edit_text(text)
-        except Exception:
-            await message.answer(text)
-    else:
-        await message.answer(text)
+    await _edit_or_answer(message, text, edit_message)
 
 
 # Handler for capturing messages during session
@@ -186,18 +382,13 @@ async def handle_capture_message(message: types.Message, state: FSMContext):
         message_text = "[НЕПОДДЕРЖИВАЕМЫЙ ТИП СООБЩЕНИЯ]"
     
     # Add message to session
-    success = await session_manager.add_message_to_session(user_id, message_text, state)
+    success, message_count = await session_manager.add_message_to_session(user_id, message_text, state)
     
     if success:
-        # Get current message count
-        session_info = await session_manager.get_session_info(state)
+        # Лічильник вже повертає add_message_to_session — без повторного запиту до БД
+        await state.update_data(message_count=message_count)
         
         # Send confirmation (every 5 messages to avoid spam)
-        # Get actual count from database
-        from services.database import get_active_session
-        active_session = await get_active_session(user_id)
-        message_count = len(active_session.messages) if active_session and active_session.messages else 0
-        
         if message_count % 5 == 0 or message_count == 1:
             await message.reply(
                 f"✅ Сообщение добавлено в сессию ({message_count})",
@@ -235,7 +426,7 @@ async def process_session_with_gpt(user_id: int, state: FSMContext, session, mes
         )
         
         # Perform GPT analysis with database saving
-        print(f"Starting GPT analysis for session {session.id}, user {user_id}")
+        logger.info("Starting GPT analysis for session %s, user %s", session.id, user_id)
         analysis_result = await gpt_analysis.analyze_conversation(
             full_text, 
             session_id=session.id, 
@@ -251,11 +442,11 @@ async def process_session_with_gpt(user_id: int, state: FSMContext, session, mes
         events = analysis_result.get("events", [])
         
         # Log results for debugging
-        print(f"Analysis completed: {len(events)} events found")
+        logger.info("Analysis completed: %d events found", len(events))
         
         # Check for analysis errors in summary
         if summary.startswith("❌"):
-            print(f"Analysis error in summary: {summary}")
+            logger.warning("Analysis error in summary: %s", summary)
             # Still save the session but mark as partial failure
             await session_manager.complete_session_processing(
                 user_id, state, summary, []
@@ -275,12 +466,12 @@ async def process_session_with_gpt(user_id: int, state: FSMContext, session, mes
         message_count = len(session.messages) if session.messages else 0
         await show_analysis_results(analysis_msg, summary, events, message_count)
         
-        print(f"Session {session.id} processing completed successfully")
+        logger.info("Session %s processing completed successfully", session.id)
         
     except Exception as e:
         # Enhanced error handling with specific error types
         error_msg = str(e)
-        print(f"Error processing session {session.id if session else 'unknown'}: {error_msg}")
+        logger.exception("Error processing session %s", session.id if session else 'unknown')
         
         # Determine error type and create appropriate message
         if "rate limit" in error_msg.lower() or "rate_limit" in error_msg.lower():
@@ -299,12 +490,12 @@ async def process_session_with_gpt(user_id: int, state: FSMContext, session, mes
             await session_manager.complete_session_processing(
                 user_id, state, user_error, []
             )
-        except Exception as completion_error:
-            print(f"Failed to complete session processing: {completion_error}")
+        except Exception:
+            logger.exception("Failed to complete session processing")
             # Force clear state to prevent user being stuck
             try:
                 await state.clear()
-            except:
+            except Exception:
                 pass
         
         # Inform user about the error
@@ -321,12 +512,12 @@ async def process_session_with_gpt(user_id: int, state: FSMContext, session, mes
                     f"{user_error}\n\n"
                     "💾 Сообщения сохранены в истории."
                 )
-        except Exception as msg_error:
-            print(f"Failed to send error message to user: {msg_error}")
+        except TelegramBadRequest:
+            logger.exception("Failed to send error message to user")
             # Last resort - try simple message
             try:
                 await message.answer("⚠️ Анализ завершен с ошибкой. Сессия сохранена.")
-            except:
+            except TelegramBadRequest:
                 pass
 
 
@@ -334,93 +525,95 @@ async def show_analysis_results(message: types.Message, summary: str, events: li
     """
     Display analysis results to user with enhanced formatting and event confirmation options
     """
+    summary_is_err = bool(summary) and summary.startswith("❌")
+    summary_is_ok = bool(summary) and not summary_is_err
+    
     try:
         # Prepare summary text with better formatting
-        result_text = f"✅ <b>Анализ сессии завершен!</b>\n\n"
-        result_text += f"📊 Обработано сообщений: <code>{message_count}</code>\n\n"
+        parts = [
+            f"✅ <b>Анализ сессии завершен!</b>\n\n",
+            f"📊 Обработано сообщений: <code>{message_count}</code>\n\n"
+        ]
         
         # Summary section with better formatting
-        if summary and not summary.startswith("❌"):
-            result_text += f"📝 <b>Резюме:</b>\n<i>{summary}</i>\n\n"
-        elif summary.startswith("❌"):
-            result_text += f"⚠️ <b>Ошибка анализа:</b>\n{summary}\n\n"
+        if summary_is_ok:
+            parts.append(f"📝 <b>Резюме:</b>\n<i>{summary}</i>\n\n")
+        elif summary_is_err:
+            parts.append(f"⚠️ <b>Ошибка анализа:</b>\n{summary}\n\n")
         else:
-            result_text += f"📝 <b>Резюме:</b>\n<i>Не удалось создать резюме</i>\n\n"
+            parts.append(f"📝 <b>Резюме:</b>\n<i>Не удалось создать резюме</i>\n\n")
+        
+        # GPT нерідко повертає ту саму подію двічі — прибираємо дублікати до рендерингу
+        events = _dedupe_events(events)
         
         # Events section with priority indicators
         if events:
-            result_text += f"📅 <b>Найденные события ({len(events)}):</b>\n"
+            parts.append(f"📅 <b>Найденные события ({len(events)}):</b>\n")
             
             # Sort events by priority and type
-            sorted_events = sorted(events, key=lambda x: (
-                {"high": 0, "medium": 1, "low": 2}.get(x.get("priority", "medium"), 1),
-                {"deadline": 0, "meeting": 1, "task": 2, "appointment": 3, "reminder": 4}.get(x.get("type", "event"), 5)
-            ))
+            sorted_events = sorted(events, key=_event_sort_key)
+            add = parts.append
             
             for i, event in enumerate(sorted_events, 1):
-                # Priority indicator
-                priority_emoji = {"high": "🔴", "medium": "🟡", "low": "🟢"}.get(event.get("priority", "medium"), "🟡")
-                
-                # Type indicator  
-                type_emoji = {
-                    "meeting": "🤝", "deadline": "⏰", "task": "📋", 
-                    "appointment": "📅", "reminder": "🔔"
-                }.get(event.get("type", "event"), "📌")
-                
-                result_text += f"\n{i}. {priority_emoji}{type_emoji} <b>{event.get('title', 'Без названия')}</b>\n"
+                prio = event.get("priority", "medium")
+                typ = event.get("type", "event")
+                date = event.get("date")
+                time_ = event.get("time")
+                location = event.get("location")
+                participants = event.get("participants")
+                items = event.get("action_items")
                 
                 # Date and time with better formatting
-                if event.get('date') or event.get('time'):
-                    date_str = ""
-                    if event.get('date'):
-                        date_str = event['date']
-                    if event.get('time'):
-                        time_str = event['time']
-                        date_str += f" в {time_str}" if date_str else f"Время: {time_str}"
-                    if date_str:
-                        result_text += f"   🕐 <code>{date_str}</code>\n"
-                
-                # Location
-                if event.get('location'):
-                    result_text += f"   📍 {event['location']}\n"
+                date_line = ""
+                if date or time_:
+                    date_str = date or ""
+                    if time_:
+                        date_str += f" в {time_}" if date_str else f"Время: {time_}"
+                    date_line = f"   🕐 <code>{date_str}</code>\n"
                 
                 # Participants with count
-                if event.get('participants'):
-                    participants = event['participants']
+                part_line = ""
+                if participants:
                     if len(participants) > 3:
-                        result_text += f"   👥 {', '.join(participants[:3])} и еще {len(participants)-3}\n"
+                        part_line = f"   👥 {', '.join(participants[:3])} и еще {len(participants)-3}\n"
                     else:
-                        result_text += f"   👥 {', '.join(participants)}\n"
+                        part_line = f"   👥 {', '.join(participants)}\n"
                 
                 # Action items with numbering
-                if event.get('action_items'):
-                    items = event['action_items']
+                items_block = ""
+                if items:
                     if len(items) == 1:
-                        result_text += f"   ✅ {items[0]}\n"
+                        items_block = f"   ✅ {items[0]}\n"
                     else:
-                        result_text += f"   ✅ Задачи ({len(items)}):\n"
-                        for j, item in enumerate(items[:3], 1):  # Show max 3 items
-                            result_text += f"      {j}. {item}\n"
+                        items_block = f"   ✅ Задачи ({len(items)}):\n" + "".join(
+                            f"      {j}. {item}\n" for j, item in enumerate(items[:3], 1)  # Show max 3 items
+                        )
                         if len(items) > 3:
-                            result_text += f"      ... и еще {len(items)-3}\n"
+                            items_block += f"      ... и еще {len(items)-3}\n"
                 
                 # Type and priority info
-                if event.get('type') != 'event' or event.get('priority') != 'medium':
-                    type_name = {
-                        "meeting": "встреча", "deadline": "дедлайн", "task": "задача", 
-                        "appointment": "встреча", "reminder": "напоминание"
-                    }.get(event.get('type', 'event'), 'событие')
-                    
-                    priority_name = {
-                        "high": "высокий", "medium": "средний", "low": "низкий"
-                    }.get(event.get('priority', 'medium'), 'средний')
-                    
-                    result_text += f"   📊 {type_name.title()}, приоритет: {priority_name}\n"
+                meta_line = ""
+                if typ != 'event' or prio != 'medium':
+                    type_name = _TYPE_NAME_RU.get(typ, 'событие')
+                    priority_name = _PRIO_NAME_RU.get(prio, 'средний')
+                    meta_line = f"   📊 {type_name.title()}, приоритет: {priority_name}\n"
+                
+                add(_EVENT_TMPL.format(
+                    idx=i,
+                    prio_e=_PRIO_EMOJI.get(prio, '🟡'),
+                    type_e=_TYPE_EMOJI.get(typ, '📌'),
+                    title=event.get('title', 'Без названия'),
+                    date_line=date_line,
+                    loc_line=f"   📍 {location}\n" if location else "",
+                    part_line=part_line,
+                    items_block=items_block,
+                    meta_line=meta_line
+                ))
             
             # Add confirmation options for events with calendar sync
-            result_text += f"\n💡 <b>Что дальше?</b>\n"
-            result_text += "• Используйте /my_sessions для просмотра истории\n"
-            result_text += "• Настройте /connect_calendar для синхронизации\n"
+            parts.append(f"\n💡 <b>Что дальше?</b>\n")
+            parts.append("• Используйте /my_sessions для просмотра истории\n")
+            parts.append("• Настройте /connect_calendar для синхронизации\n")
             
             # Check if calendar is connected and add sync option
             session_data = await session_manager.get_current_session_data(message.from_user.id)
@@ -429,155 +622,164 @@ async def show_analysis_results(message: types.Message, summary: str, events: li
             if session_id:
                 is_calendar_connected = await google_oauth.check_user_connected(message.from_user.id)
                 if is_calendar_connected:
-                    result_text += f"\n📅 <b>Календарь подключен!</b>\n"
+                    parts.append(f"\n📅 <b>Календарь подключен!</b>\n")
                     # Smart message splitting with calendar sync keyboard
-                    await send_long_message_with_calendar_sync(message, result_text, events, session_id)
+                    await send_long_message_with_calendar_sync(message, "".join(parts), events, session_id)
                     return
                 else:
-                    result_text += f"\n📅 <b>Подключите календарь</b> для автоматического создания событий:\n"
-                    result_text += "/connect_calendar\n"
+                    parts.append(f"\n📅 <b>Подключите календарь</b> для автоматического создания событий:\n")
+                    parts.append("/connect_calendar\n")
             
         else:
-            result_text += "📅 <b>События не найдены</b>\n"
-            result_text += "В сессии не было обнаружено встреч, дедлайнов или задач.\n\n"
-            result_text += "💡 <b>Совет:</b> Попробуйте более подробно описать даты, время и задачи в следующих сессиях."
+            parts.append("📅 <b>События не найдены</b>\n")
+            parts.append("В сессии не было обнаружено встреч, дедлайнов или задач.\n\n")
+            parts.append("💡 <b>Совет:</b> Попробуйте более подробно описать даты, время и задачи в следующих сессиях.")
         
         # Smart message splitting
+        result_text = "".join(parts)
         await send_long_message(message, result_text, events)
             
-    except Exception as e:
+    except Exception:
         # Enhanced fallback with error logging
-        print(f"Error displaying analysis results: {e}")
+        logger.exception("Error displaying analysis results")
         try:
-            fallback_text = (
+            fallback_parts = [
                 f"✅ <b>Анализ завершен!</b>\n\n"
                 f"📊 Обработано: <code>{message_count}</code> сообщений\n\n"
-            )
+            ]
             
-            if summary and not summary.startswith("❌"):
+            if summary_is_ok:
                 # Truncate summary if too long
                 summary_short = summary[:300] + "..." if len(summary) > 300 else summary
-                fallback_text += f"📝 <b>Резюме:</b>\n<i>{summary_short}</i>\n\n"
+                fallback_parts.append(f"📝 <b>Резюме:</b>\n<i>{summary_short}</i>\n\n")
             
             if events:
-                fallback_text += f"📅 Найдено событий: <code>{len(events)}</code>\n"
-                fallback_text += "Используйте /my_sessions для подробного просмотра"
+                fallback_parts.append(f"📅 Найдено событий: <code>{len(events)}</code>\n")
+                fallback_parts.append("Используйте /my_sessions для подробного просмотра")
             else:
-                fallback_text += "📅 События не найдены"
+                fallback_parts.append("📅 События не найдены")
             
-            await message.edit_text(fallback_text)
-        except Exception as fallback_error:
-            print(f"Fallback display also failed: {fallback_error}")
+            await _retry_after(lambda: message.edit_text("".join(fallback_parts)))
+        except TelegramBadRequest:
+            logger.exception("Fallback display also failed")
             try:
                 await message.edit_text("✅ Анализ завершен! Результаты сохранены.")
-            except:
+            except TelegramBadRequest:
                 pass
 
 
+def _chunk_html(text: str, limit: int = 4000) -> list:
+    """
+    Split HTML text into chunks of at most limit characters.
+    Cuts at a paragraph break, then a newline, then a space, and only then mid-word.
+    Tags left open at a cut are closed at the end of the chunk and reopened in the next one.
+    """
+    chunks = []
+    open_tags = []
+    i = 0
+    n = len(text)
+    
+    while i < n:
+        prefix = "".join(f"<{tag}>" for tag in open_tags)
+        # Запас під закриваючі теги, які можуть знадобитися в кінці частини
+        budget = limit - len(prefix) - _HTML_TAG_RESERVE
+        
+        if n - i <= budget:
+            end = next_start = n
+        else:
+            hi = i + budget
+            for sep in ('\n\n', '\n', ' '):
+                end = text.rfind(sep, i, hi)
+                if end > i:
+                    next_start = end + len(sep)
+                    break
+            else:
+                end = next_start = hi
+            # Не розрізаємо тег чи HTML-сутність посередині
+            lt = text.rfind('<', i, end)
+            if lt > text.rfind('>', i, end) and lt > i:
+                end = next_start = lt
+            amp = text.rfind('&', i, end)
+            if amp > text.rfind(';', i, end) and amp > i:
+                end = next_start = amp
+        
+        body = text[i:end]
+        for closing, tag in _TG_HTML_TAG_SPLIT_RE.findall(body):
+            if not closing:
+                open_tags.append(tag)
+            elif tag in open_tags:
+                del open_tags[len(open_tags) - 1 - open_tags[::-1].index(tag)]
+        
+        suffix = "".join(f"</{tag}>" for tag in reversed(open_tags))
+        chunks.append(prefix + body + suffix)
+        i = next_start
+    
+    return chunks or [text]
+
+
 async def send_long_message(message: types.Message, text: str, events: list = None):
     """
     Send long messages with smart splitting to avoid Telegram limits
     """
     MAX_LENGTH = 4096
     
-    if len(text) <= MAX_LENGTH:
-        await message.edit_text(text, disable_web_page_preview=True)
-        return
-    
-    # Split at logical points
-    parts = []
-    current_part = ""
-    
-    for line in text.split('\n'):
-        if len(current_part) + len(line) + 1 > MAX_LENGTH:
-            if current_part:
-                parts.append(current_part)
-                current_part = line
-            else:
-                # Single line is too long, force split
-                parts.append(line[:MAX_LENGTH])
-                current_part = line[MAX_LENGTH:]
-        else:
-            current_part += ('\n' if current_part else '') + line
-    
-    if current_part:
-        parts.append(current_part)
+    parts = _chunk_html(text, MAX_LENGTH)
     
     # Send parts
     for i, part in enumerate(parts):
+        send = message.edit_text if i == 0 else message.answer
         try:
-            if i == 0:
-                await message.edit_text(part, disable_web_page_preview=True)
-            else:
-                await message.answer(part, disable_web_page_preview=True)
-        except Exception as e:
-            print(f"Error sending message part {i}: {e}")
+            await _retry_after(lambda: send(part, disable_web_page_preview=True))
+        except TelegramBadRequest as e:
+            logger.warning("Error sending message part %d: %s", i, e)
             # Try without formatting
             try:
-                clean_part = part.replace('<b>', '').replace('</b>', '').replace('<i>', '').replace('</i>', '').replace('<code>', '').replace('</code>', '')
-                if i == 0:
-                    await message.edit_text(clean_part)
-                else:
-                    await message.answer(clean_part)
-            except:
-                pass 
+                clean_part = _TG_HTML_TAG_RE.sub('', part)
+                await send(clean_part)
+            except TelegramBadRequest:
+                pass
 
 
 async def send_long_message_with_calendar_sync(message: types.Message, text: str, events: list, session_id: int):
     """
     Send long messages with calendar sync buttons
     """
-    from keyboards.inline import get_calendar_sync_keyboard
-    
     MAX_LENGTH = 4000  # Leave room for keyboard
     
-    if len(text) <= MAX_LENGTH:
-        keyboard = get_calendar_sync_keyboard(session_id, len(events))
-        await message.edit_text(text, reply_markup=keyboard, disable_web_page_preview=True)
-        return
-    
-    # Split message but add keyboard to last part
-    parts = []
-    current_part = ""
-    
-    for line in text.split('\n'):
-        if len(current_part) + len(line) + 1 > MAX_LENGTH:
-            if current_part:
-                parts.append(current_part)
-                current_part = line
-            else:
-                parts.append(line[:MAX_LENGTH])
-                current_part = line[MAX_LENGTH:]
-        else:
-            current_part += ('\n' if current_part else '') + line
+    parts = _chunk_html(text, MAX_LENGTH)
+    keyboard = get_calendar_sync_keyboard(session_id, len(events))
     
-    if current_part:
-        parts.append(current_part)
+    try:
+        await _retry_after(lambda: message.edit_text(
+            parts[0],
+            reply_markup=keyboard if len(parts) == 1 else None,
+            disable_web_page_preview=True
+        ))
+    except TelegramBadRequest as e:
+        logger.warning("Error sending message part 0: %s", e)
+    
+    if len(parts) == 1:
+        return
     
-    # Send parts
-    for i, part in enumerate(parts):
+    # Частини — шматки одного HTML-тексту, тому шлемо строго по черзі;
+    # клавіатура йде з останньою частиною
+    for i, part in enumerate(parts[1:], 1):
+        markup = keyboard if i == len(parts) - 1 else None
         try:
-            if i == 0:
-                await message.edit_text(part, disable_web_page_preview=True)
-            elif i == len(parts) - 1:  # Last part gets the keyboard
-                keyboard = get_calendar_sync_keyboard(session_id, len(events))
-                await message.answer(part, reply_markup=keyboard, disable_web_page_preview=True)
-            else:
-                await message.answer(part, disable_web_page_preview=True)
-        except Exception as e:
-            print(f"Error sending message part {i}: {e}")
+            await _retry_after(lambda: message.answer(part, reply_markup=markup, disable_web_page_preview=True))
+        except TelegramBadRequest as e:
+            logger.warning("Error sending message part %d: %s", i, e)
 
 
 @router.callback_query(F.data.startswith("sync_calendar_"))
 async def cq_sync_calendar(callback: types.CallbackQuery, state: FSMContext):
     """Handle calendar sync request - show event confirmation"""
-    session_id = int(callback.data.split("_")[2])
+    session_id = int(_CB_PATTERNS['sync_calendar'].match(callback.data).group(1))
     user_id = callback.from_user.id
     
-    # Get session events
+    # Get session events and calendar status in one query
     try:
-        from services.database import get_session_events
-        events = await get_session_events(session_id)
+        events, calendar_connected = await get_session_events_with_calendar(session_id, user_id)
         
         if not events:
             await callback.message.edit_text(
@@ -586,11 +788,19 @@ async def cq_sync_calendar(callback: types.CallbackQuery, state: FSMContext):
             )
             return
         
+        if not calendar_connected:
+            await callback.message.edit_text(
+                "📅 <b>Календарь не подключен</b>\n\n"
+                "Подключите Google Calendar, чтобы синхронизировать события:\n"
+                "/connect_calendar"
+            )
+            return
+        
         # Show event confirmation interface
-        await show_event_confirmation(callback.message, session_id, events, user_id)
+        await show_event_confirmation(callback.message, session_id, events, user_id, state)
         
-    except Exception as e:
-        print(f"Error loading events for confirmation: {e}")
+    except Exception:
+        logger.exception("Error loading events for confirmation")
         await callback.message.edit_text(
             f"❌ <b>Ошибка загрузки событий</b>\n\n"
             f"Не удалось загрузить события из сессии #{session_id}."
@@ -606,6 +816,8 @@ async def cq_skip_calendar(callback: types.CallbackQuery, state: FSMContext):
         f"📚 Используйте /my_sessions для просмотра истории.\n\n"
         f"💡 Подключите календарь для автоматической синхронизации: /connect_calendar"
     )
+    # Повідомлення більше не показує підтвердження — наступний показ має перемалювати його
+    await state.update_data(event_rendered_hash=None)
 
 
 @router.message(Command("my_sessions"))
@@ -615,31 +827,11 @@ async def cmd_my_sessions(message: types.Message, state: FSMContext):
     """
     user_id = message.from_user.id
     
-    # Parse command arguments for page and filters
-    command_parts = message.text.split()
-    page = 1
-    status_filter = None
-    search_query = None
-    
     # Simple command parsing: /my_sessions [page] [status] [search]
-    if len(command_parts) > 1:
-        try:
-            page = int(command_parts[1])
-        except ValueError:
-            # First argument might be status or search
-            if command_parts[1] in ['completed', 'active', 'failed']:
-                status_filter = command_parts[1]
-            else:
-                search_query = ' '.join(command_parts[1:])
-    
-    if len(command_parts) > 2 and not search_query:
-        if command_parts[2] in ['completed', 'active', 'failed']:
-            status_filter = command_parts[2]
-        else:
-            search_query = ' '.join(command_parts[2:])
-    
-    if len(command_parts) > 3 and not search_query:
-        search_query = ' '.join(command_parts[3:])
+    match = _MY_SESSIONS_RE.match((message.text or "").strip())
+    page = int(match.group('page') or 1) if match else 1
+    status_filter = match.group('status') if match else None
+    search_query = match.group('q') if match else None
     
     await show_user_sessions(message, user_id, page, status_filter, search_query)
 
@@ -654,18 +846,16 @@ async def show_user_sessions(
     """
     Display user sessions with pagination and filtering
     """
-    from services.database import get_user_sessions_paginated, get_user_stats
-    from keyboards.inline import get_sessions_pagination_keyboard
     
     try:
-        # Get user stats first
-        stats = await get_user_stats(user_id)
-        
-        # Get paginated sessions
         per_page = 5  # Show 5 sessions per page for better readability
-        sessions, total_count = await get_user_sessions_paginated(
-            user_id, page, per_page, status_filter, search_query
+        
+        # Stats and the page of sessions are independent queries — run them concurrently
+        stats, (sessions, total_count) = await asyncio.gather(
+            get_user_stats(user_id),
+            get_user_sessions_paginated(user_id, page, per_page, status_filter, search_query)
         )
+        total_pages = -(-total_count // per_page)  # ceil division
         
         if total_count == 0:
             # No sessions found
@@ -691,7 +881,7 @@ async def show_user_sessions(
         if search_query:
             header += f"🔎 Поиск: {search_query}\n"
         
-        header += f"📄 Страница {page} из {(total_count + per_page - 1) // per_page}\n\n"
+        header += f"📄 Страница {page} из {total_pages}\n\n"
         
         # Build sessions list
         sessions_text = ""
@@ -699,32 +889,22 @@ async def show_user_sessions(
             session_number = (page - 1) * per_page + i
             
             # Session status emoji
-            status_emoji = {
-                'completed': '✅',
-                'active': '🔄',
-                'failed': '❌'
-            }.get(session.status, '❓')
+            status_emoji = _STATUS_EMOJI.get(session.status, '❓')
             
             # Format dates
-            start_date = session.start_time.strftime('%d.%m.%Y %H:%M')
-            end_date = session.end_time.strftime('%d.%m.%Y %H:%M') if session.end_time else "—"
-            
-            # Message count
-            message_count = len(session.messages) if session.messages else 0
+            start_date = _fmt_dt(session.start_time)
+            end_date = _fmt_dt(session.end_time) if session.end_time else "—"
             
-            # Events count
-            events_count = len(session.extracted_events) if session.extracted_events else 0
-            
-            # Summary preview
+            # Summary preview (already cut to 100 chars by the query)
             summary_preview = ""
-            if session.summary:
-                summary_preview = session.summary[:100] + "..." if len(session.summary) > 100 else session.summary
-                summary_preview = f"\n💭 {summary_preview}"
+            if session.summary_preview:
+                ellipsis = "..." if session.summary_length > len(session.summary_preview) else ""
+                summary_preview = f"\n💭 {session.summary_preview}{ellipsis}"
             
             sessions_text += (
                 f"{status_emoji} <b>Сессия #{session.id}</b>\n"
                 f"📅 {start_date} — {end_date}\n"
-                f"📝 Сообщений: {message_count} | 📅 События: {events_count}{summary_preview}\n\n"
+                f"📝 Сообщений: {session.message_count} | 📅 События: {session.events_count}{summary_preview}\n\n"
             )
         
         # Combine text
@@ -742,7 +922,7 @@ async def show_user_sessions(
         # Get pagination keyboard
         keyboard = get_sessions_pagination_keyboard(
             page, 
-            (total_count + per_page - 1) // per_page, 
+            total_pages, 
             status_filter, 
             search_query
         )
@@ -757,7 +937,7 @@ async def show_user_sessions(
 
 
 @router.message(Command("session_details"))
-async def cmd_session_details(message: types.Message, state: FSMContext):
+async def cmd_session_details(message: types.Message, state: FSMContext, db_session: AsyncSession):
     """
     Show detailed information about a specific session
     """
@@ -777,107 +957,90 @@ async def cmd_session_details(message: types.Message, state: FSMContext):
         await message.answer("❌ ID сессии должен быть числом.")
         return
     
-    await show_session_details(message, user_id, session_id)
+    await show_session_details(message, user_id, session_id, db_session)
 
 
-async def show_session_details(message: types.Message, user_id: int, session_id: int):
+def _render_session_details(session) -> str:
+    """Build the session details card shown by /session_details"""
+    events = session.events
+    
+    # Format session details
+    status_emoji = _STATUS_EMOJI.get(session.status, '❓')
+    
+    start_date = _fmt_dt(session.start_time)
+    end_date = _fmt_dt(session.end_time) if session.end_time else "—"
+    
+    # JSON-колонка — SQLAlchemy вже повертає список, повторно декодувати не треба
+    messages = session.messages or []
+    message_count = len(messages)
+    events_count = len(events)
+    
+    # Build header
+    parts = [f"{status_emoji} <b>Сессия #{session.id}</b>\n\n"]
+    parts.append(f"📅 Начата: {start_date}\n")
+    parts.append(f"🏁 Завершена: {end_date}\n")
+    parts.append(f"📝 Сообщений: {message_count}\n")
+    parts.append(f"📅 Извлечено событий: {events_count}\n\n")
+    
+    # Add summary
+    if session.summary:
+        parts.append(f"📋 <b>Резюме:</b>\n{session.summary}\n\n")
+    
+    # Add events
+    if events:
+        parts.append("📅 <b>Извлеченные события:</b>\n")
+        for event in events:
+            prefix = _session_event_prefix(event)
+            
+            event_date = _fmt_dt_short(event.start_datetime) if event.start_datetime else 'Без даты'
+            
+            parts.append(f"{prefix} {event.title}\n")
+            parts.append(f"   📅 {event_date}")
+            if event.location:
+                parts.append(f" | 📍 {event.location}")
+            parts.append("\n")
+        parts.append("\n")
+    
+    # Add sample messages if available
+    if messages:
+        parts.append("💬 <b>Примеры сообщений:</b>\n")
+        sample = messages[:3]
+        texts = (msg.get('text', '') if isinstance(msg, dict) else str(msg) for msg in sample)
+        parts.extend(f"• {text[:100] + '...' if len(text) > 100 else text}\n" for text in texts)
+        
+        if message_count > len(sample):
+            parts.append(f"... и еще {message_count - len(sample)} сообщений\n")
+    
+    return "".join(parts)
+
+
+async def show_session_details(message: types.Message, user_id: int, session_id: int, db_session: AsyncSession):
     """
     Display detailed information about a specific session
     """
-    from services.database import AsyncSessionLocal, get_session_events
-    from sqlalchemy import select
-    
     try:
-        async with AsyncSessionLocal() as db_session:
-            # Get session
-            stmt = select(CaptureSession).where(
-                CaptureSession.id == session_id,
-                CaptureSession.user_id == user_id
-            )
-            result = await db_session.execute(stmt)
-            session = result.scalar_one_or_none()
+        text = _get_cached_render('details', session_id, user_id)
+        
+        if text is None:
+            # Session and its events in one call
+            session = await get_session_with_events(session_id, user_id, db_session)
             
             if not session:
                 await message.answer("❌ Сессия не найдена или не принадлежит вам.")
                 return
             
-            # Get events for this session
-            events = await get_session_events(session_id)
-            
-            # Format session details
-            status_emoji = {
-                'completed': '✅',
-                'active': '🔄',
-                'failed': '❌'
-            }.get(session.status, '❓')
-            
-            start_date = session.start_time.strftime('%d.%m.%Y %H:%M')
-            end_date = session.end_time.strftime('%d.%m.%Y %H:%M') if session.end_time else "—"
-            
-            message_count = len(session.messages) if session.messages else 0
-            events_count = len(events)
-            
-            # Build header
-            text = f"{status_emoji} <b>Сессия #{session.id}</b>\n\n"
-            text += f"📅 Начата: {start_date}\n"
-            text += f"🏁 Завершена: {end_date}\n"
-            text += f"📝 Сообщений: {message_count}\n"
-            text += f"📅 Извлечено событий: {events_count}\n\n"
-            
-            # Add summary
-            if session.summary:
-                text += f"📋 <b>Резюме:</b>\n{session.summary}\n\n"
-            
-            # Add events
-            if events:
-                text += "📅 <b>Извлеченные события:</b>\n"
-                for event in events:
-                    priority_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(event.priority, '⚪')
-                    type_emoji = {
-                        'meeting': '👥',
-                        'deadline': '⏰', 
-                        'task': '✅',
-                        'appointment': '📅',
-                        'reminder': '💭'
-                    }.get(event.event_type, '📝')
-                    
-                    event_date = event.start_datetime.strftime('%d.%m %H:%M') if event.start_datetime else 'Без даты'
-                    
-                    text += f"{type_emoji} {priority_emoji} {event.title}\n"
-                    text += f"   📅 {event_date}"
-                    if event.location:
-                        text += f" | 📍 {event.location}"
-                    text += "\n"
-                text += "\n"
-            
-            # Add sample messages if available
-            if session.messages:
-                text += "💬 <b>Примеры сообщений:</b>\n"
-                sample_count = min(3, len(session.messages))
-                for i in range(sample_count):
-                    msg = session.messages[i]
-                    msg_text = msg.get('text', '') if isinstance(msg, dict) else str(msg)
-                    if len(msg_text) > 100:
-                        msg_text = msg_text[:100] + "..."
-                    text += f"• {msg_text}\n"
-                
-                if len(session.messages) > sample_count:
-                    text += f"... и еще {len(session.messages) - sample_count} сообщений\n"
-            
-            # Add action buttons for the session
-            from keyboards.inline import get_session_actions_keyboard
-            keyboard = get_session_actions_keyboard(session_id)
-            
-            # Send with action buttons if text is short enough, otherwise split
-            if len(text) < 4000:
-                await message.answer(text, reply_markup=keyboard)
-            else:
-                await send_long_message(message, text)
-                await message.answer(
-                    f"🔧 <b>Действия для сессии #{session_id}:</b>",
-                    reply_markup=keyboard
-                )
-            
+            text = _render_session_details(session)
+            _store_render('details', session, user_id, text)
+        
+        # Add action buttons for the session
+        keyboard = get_session_actions_keyboard(session_id)
+        
+        # Split on paragraph boundaries; action buttons go with the last part
+        chunks = _chunk_html(text)
+        for chunk in chunks[:-1]:
+            await message.answer(chunk)
+        await message.answer(chunks[-1], reply_markup=keyboard)
+        
     except Exception as e:
         await message.answer(
             f"❌ Ошибка при получении деталей сессии: {str(e)}\n\n"
@@ -891,12 +1054,15 @@ async def cq_sessions_page(callback: types.CallbackQuery, state: FSMContext):
     """Handle session pagination callbacks"""
     await callback.answer()
     
-    data_parts = callback.data.split("_")
-    page = int(data_parts[2])
+    match = _CB_PATTERNS['sessions_page'].match(callback.data)
+    if not match:
+        # sessions_page_info — кнопка з номером сторінки, нічого не робить
+        return
+    page = int(match.group(1))
     
-    # Extract filters from callback data if present
-    status_filter = data_parts[3] if len(data_parts) > 3 and data_parts[3] != "none" else None
-    search_query = "_".join(data_parts[4:]) if len(data_parts) > 4 else None
+    # Extract filters from callback data if present ("none" means no filter)
+    status_filter = match.group(2) if match.group(2) != "none" else None
+    search_query = match.group(3) if match.group(3) != "none" else None
     
     user_id = callback.from_user.id
     
@@ -906,119 +1072,107 @@ async def cq_sessions_page(callback: types.CallbackQuery, state: FSMContext):
     # Edit the original message instead of sending new one
     try:
         await callback.message.delete()
-    except Exception:
-        pass 
+    except TelegramBadRequest:
+        pass
 
 
 # Session export functionality
-async def export_session_text(session_id: int, user_id: int, format_type: str = "txt") -> str:
-    """Export session as formatted text"""
-    from services.database import AsyncSessionLocal, get_session_events
-    from sqlalchemy import select
-    
-    async with AsyncSessionLocal() as db_session:
-        # Get session
-        stmt = select(CaptureSession).where(
-            CaptureSession.id == session_id,
-            CaptureSession.user_id == user_id
-        )
-        result = await db_session.execute(stmt)
-        session = result.scalar_one_or_none()
-        
-        if not session:
-            return None
-        
-        # Get events
-        events = await get_session_events(session_id)
-        
-        # Format based on type
-        if format_type == "md":
-            return format_session_markdown(session, events)
-        elif format_type == "json":
-            return format_session_json(session, events)
-        elif format_type == "csv":
-            return format_events_csv(events)
-        else:  # txt
-            return format_session_text(session, events)
+async def export_session_text(
+    session_id: int,
+    user_id: int,
+    db_session: AsyncSession,
+    format_type: str = "txt"
+) -> Optional[bytes]:
+    """Export session as a UTF-8 encoded file body"""
+    session = await get_session_with_events(session_id, user_id, db_session)
+    
+    if not session:
+        return None
+    
+    events = session.events
+    
+    # Format based on type
+    if format_type == "md":
+        return format_session_markdown(session, events)
+    elif format_type == "json":
+        return format_session_json(session, events)
+    elif format_type == "csv":
+        return format_events_csv(events)
+    else:  # txt
+        return format_session_text(session, events)
 
 
-def format_session_text(session, events) -> str:
+def format_session_text(session, events) -> bytes:
     """Format session as plain text"""
-    start_date = session.start_time.strftime('%d.%m.%Y %H:%M')
-    end_date = session.end_time.strftime('%d.%m.%Y %H:%M') if session.end_time else "—"
+    start_date = _fmt_dt(session.start_time)
+    end_date = _fmt_dt(session.end_time) if session.end_time else "—"
     
-    text = f"СЕССИЯ ЗАХВАТА #{session.id}\n"
-    text += f"{'=' * 50}\n\n"
-    text += f"Период: {start_date} — {end_date}\n"
-    text += f"Сообщений: {len(session.messages) if session.messages else 0}\n"
-    text += f"Статус: {session.status}\n\n"
+    parts = [f"СЕССИЯ ЗАХВАТА #{session.id}\n"]
+    parts.append(f"{'=' * 50}\n\n")
+    parts.append(f"Период: {start_date} — {end_date}\n")
+    parts.append(f"Сообщений: {len(session.messages) if session.messages else 0}\n")
+    parts.append(f"Статус: {session.status}\n\n")
     
     if session.summary:
-        text += f"РЕЗЮМЕ:\n{'-' * 20}\n{session.summary}\n\n"
+        parts.append(f"РЕЗЮМЕ:\n{'-' * 20}\n{session.summary}\n\n")
     
     if events:
-        text += f"СОБЫТИЯ ({len(events)}):\n{'-' * 20}\n"
+        parts.append(f"СОБЫТИЯ ({len(events)}):\n{'-' * 20}\n")
         for i, event in enumerate(events, 1):
-            text += f"{i}. {event.title}\n"
-            text += f"   Тип: {event.event_type} | Приоритет: {event.priority}\n"
+            parts.append(f"{i}. {event.title}\n")
+            parts.append(f"   Тип: {event.event_type} | Приоритет: {event.priority}\n")
             if event.start_datetime:
-                text += f"   Дата: {event.start_datetime.strftime('%d.%m.%Y %H:%M')}\n"
+                parts.append(f"   Дата: {_fmt_dt(event.start_datetime)}\n")
             if event.location:
-                text += f"   Место: {event.location}\n"
-            text += "\n"
+                parts.append(f"   Место: {event.location}\n")
+            parts.append("\n")
     
     if session.messages:
-        text += f"СООБЩЕНИЯ:\n{'-' * 20}\n"
+        parts.append(f"СООБЩЕНИЯ:\n{'-' * 20}\n")
         for i, msg in enumerate(session.messages, 1):
             msg_text = msg.get('text', '') if isinstance(msg, dict) else str(msg)
             timestamp = msg.get('timestamp', '') if isinstance(msg, dict) else ''
-            text += f"{i}. [{timestamp}] {msg_text}\n"
+            parts.append(f"{i}. [{timestamp}] {msg_text}\n")
     
-    return text
+    return "".join(parts).encode('utf-8')
 
 
-def format_session_markdown(session, events) -> str:
+def format_session_markdown(session, events) -> bytes:
     """Format session as Markdown"""
-    start_date = session.start_time.strftime('%d.%m.%Y %H:%M')
-    end_date = session.end_time.strftime('%d.%m.%Y %H:%M') if session.end_time else "—"
+    start_date = _fmt_dt(session.start_time)
+    end_date = _fmt_dt(session.end_time) if session.end_time else "—"
     
-    text = f"# Сессия захвата #{session.id}\n\n"
-    text += f"**Период:** {start_date} — {end_date}  \n"
-    text += f"**Сообщений:** {len(session.messages) if session.messages else 0}  \n"
-    text += f"**Статус:** {session.status}\n\n"
+    parts = [f"# Сессия захвата #{session.id}\n\n"]
+    parts.append(f"**Период:** {start_date} — {end_date}  \n")
+    parts.append(f"**Сообщений:** {len(session.messages) if session.messages else 0}  \n")
+    parts.append(f"**Статус:** {session.status}\n\n")
     
     if session.summary:
-        text += f"## Резюме\n\n{session.summary}\n\n"
+        parts.append(f"## Резюме\n\n{session.summary}\n\n")
     
     if events:
-        text += f"## События ({len(events)})\n\n"
+        parts.append(f"## События ({len(events)})\n\n")
         for i, event in enumerate(events, 1):
-            priority_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(event.priority, '⚪')
-            type_emoji = {
-                'meeting': '👥', 'deadline': '⏰', 'task': '✅',
-                'appointment': '📅', 'reminder': '💭'
-            }.get(event.event_type, '📝')
+            prefix = _session_event_prefix(event)
             
-            text += f"{i}. {type_emoji} {priority_emoji} **{event.title}**\n"
-            text += f"   - Тип: {event.event_type}\n"
-            text += f"   - Приоритет: {event.priority}\n"
+            parts.append(f"{i}. {prefix} **{event.title}**\n")
+            parts.append(f"   - Тип: {event.event_type}\n")
+            parts.append(f"   - Приоритет: {event.priority}\n")
             if event.start_datetime:
-                text += f"   - Дата: {event.start_datetime.strftime('%d.%m.%Y %H:%M')}\n"
+                parts.append(f"   - Дата: {_fmt_dt(event.start_datetime)}\n")
             if event.location:
-                text += f"   - Место: {event.location}\n"
-            text += "\n"
+                parts.append(f"   - Место: {event.location}\n")
+            parts.append("\n")
     
-    return text
+    return "".join(parts).encode('utf-8')
 
 
-def format_session_json(session, events) -> str:
+def format_session_json(session, events) -> bytes:
     """Format session as JSON"""
-    import json
-    
     session_data = {
         "id": session.id,
-        "start_time": session.start_time.isoformat(),
-        "end_time": session.end_time.isoformat() if session.end_time else None,
+        "start_time": session.start_time,
+        "end_time": session.end_time,
         "status": session.status,
         "summary": session.summary,
         "messages": session.messages,
@@ -1028,8 +1182,8 @@ def format_session_json(session, events) -> str:
                 "title": event.title,
                 "event_type": event.event_type,
                 "priority": event.priority,
-                "start_datetime": event.start_datetime.isoformat() if event.start_datetime else None,
-                "end_datetime": event.end_datetime.isoformat() if event.end_datetime else None,
+                "start_datetime": event.start_datetime,
+                "end_datetime": event.end_datetime,
                 "location": event.location,
                 "participants": event.participants,
                 "action_items": event.action_items
@@ -1038,60 +1192,60 @@ def format_session_json(session, events) -> str:
         ]
     }
     
-    return json.dumps(session_data, ensure_ascii=False, indent=2)
+    # orjson сам серіалізує datetime в ISO 8601 і одразу віддає UTF-8 байти
+    return orjson.dumps(session_data, option=orjson.OPT_INDENT_2)
 
 
-def format_events_csv(events) -> str:
+def format_events_csv(events) -> bytes:
     """Format events as CSV"""
-    import csv
-    import io
-    
-    output = io.StringIO()
+    buffer = io.BytesIO()
+    output = io.TextIOWrapper(buffer, encoding='utf-8', newline='')
     writer = csv.writer(output)
     
     # Header
     writer.writerow(['ID', 'Название', 'Тип', 'Приоритет', 'Дата начала', 'Дата окончания', 'Место', 'Участники'])
     
-    # Data
-    for event in events:
-        participants = ', '.join(event.participants) if event.participants else ''
-        writer.writerow([
+    # Data — один виклик writerows, цикл по рядках іде всередині _csv
+    writer.writerows(
+        (
             event.id,
             event.title,
             event.event_type,
             event.priority,
-            event.start_datetime.strftime('%d.%m.%Y %H:%M') if event.start_datetime else '',
-            event.end_datetime.strftime('%d.%m.%Y %H:%M') if event.end_datetime else '',
+            _fmt_dt(event.start_datetime) if event.start_datetime else '',
+            _fmt_dt(event.end_datetime) if event.end_datetime else '',
             event.location or '',
-            participants
-        ])
+            ', '.join(event.participants) if event.participants else ''
+        )
+        for event in events
+    )
     
-    return output.getvalue()
+    output.flush()
+    return buffer.getvalue()
 
 
 # Session action callback handlers
 @router.callback_query(F.data.startswith("export_session_"))
-async def cq_export_session(callback: types.CallbackQuery, state: FSMContext):
+async def cq_export_session(callback: types.CallbackQuery, state: FSMContext, db_session: AsyncSession):
     """Handle session export requests"""
     await callback.answer()
     
-    data_parts = callback.data.split("_")
-    session_id = int(data_parts[2])
-    export_type = data_parts[3]  # text or json
+    match = _CB_PATTERNS['export_session'].match(callback.data)
+    session_id = int(match.group(1))
+    export_type = match.group(2)  # text or json
     
     user_id = callback.from_user.id
     
     try:
         if export_type == "text":
             # Show format selection
-            from keyboards.inline import get_export_format_keyboard
             await callback.message.edit_text(
                 f"📄 Выберите формат экспорта для сессии #{session_id}:",
                 reply_markup=get_export_format_keyboard(session_id)
             )
         elif export_type == "json":
             # Direct JSON export
-            content = await export_session_text(session_id, user_id, "json")
+            content = await export_session_text(session_id, user_id, db_session, "json")
             if content:
                 await send_export_file(callback.message, content, f"session_{session_id}.json", "application/json")
             else:
@@ -1101,18 +1255,18 @@ async def cq_export_session(callback: types.CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("export_format_"))
-async def cq_export_format(callback: types.CallbackQuery, state: FSMContext):
+async def cq_export_format(callback: types.CallbackQuery, state: FSMContext, db_session: AsyncSession):
     """Handle format selection for export"""
     await callback.answer()
     
-    data_parts = callback.data.split("_")
-    session_id = int(data_parts[2])
-    format_type = data_parts[3]
+    match = _CB_PATTERNS['export_format'].match(callback.data)
+    session_id = int(match.group(1))
+    format_type = match.group(2)
     
     user_id = callback.from_user.id
     
     try:
-        content = await export_session_text(session_id, user_id, format_type)
+        content = await export_session_text(session_id, user_id, db_session, format_type)
         if content:
             # Determine file extension and MIME type
             extensions = {'txt': '.txt', 'md': '.md', 'json': '.json', 'csv': '.csv'}
@@ -1134,21 +1288,21 @@ async def cq_export_format(callback: types.CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("share_session_"))
-async def cq_share_session(callback: types.CallbackQuery, state: FSMContext):
+async def cq_share_session(callback: types.CallbackQuery, state: FSMContext, db_session: AsyncSession):
     """Handle session sharing requests"""
     await callback.answer()
     
-    data_parts = callback.data.split("_")
-    session_id = int(data_parts[2])
-    share_type = data_parts[3]  # summary or events
+    match = _CB_PATTERNS['share_session'].match(callback.data)
+    session_id = int(match.group(1))
+    share_type = match.group(2)  # summary or events
     
     user_id = callback.from_user.id
     
     try:
         if share_type == "summary":
-            content = await get_session_summary_share(session_id, user_id)
+            content = await get_session_summary_share(session_id, user_id, db_session)
         else:  # events
-            content = await get_session_events_share(session_id, user_id)
+            content = await get_session_events_share(session_id, user_id, db_session)
         
         if content:
             await callback.message.edit_text(
@@ -1163,81 +1317,71 @@ async def cq_share_session(callback: types.CallbackQuery, state: FSMContext):
         await callback.message.edit_text(f"❌ Ошибка при подготовке: {str(e)}")
 
 
-async def get_session_summary_share(session_id: int, user_id: int) -> str:
+async def get_session_summary_share(session_id: int, user_id: int, db_session: AsyncSession) -> str:
     """Get formatted summary for sharing"""
-    from services.database import AsyncSessionLocal
-    from sqlalchemy import select
+    cached = _get_cached_render('summary', session_id, user_id)
+    if cached is not None:
+        return cached
     
-    async with AsyncSessionLocal() as db_session:
-        stmt = select(CaptureSession).where(
-            CaptureSession.id == session_id,
-            CaptureSession.user_id == user_id
-        )
-        result = await db_session.execute(stmt)
-        session = result.scalar_one_or_none()
-        
-        if not session:
-            return None
-        
-        start_date = session.start_time.strftime('%d.%m.%Y %H:%M')
-        text = f"📋 <b>Резюме сессии от {start_date}</b>\n\n"
-        
-        if session.summary:
-            text += session.summary
-        else:
-            text += "Резюме не было создано для этой сессии."
-        
-        return text
+    stmt = select(CaptureSession).options(raiseload('*')).where(
+        CaptureSession.id == session_id,
+        CaptureSession.user_id == user_id
+    )
+    result = await db_session.execute(stmt)
+    session = result.scalar_one_or_none()
+    
+    if not session:
+        return None
+    
+    start_date = _fmt_dt(session.start_time)
+    text = f"📋 <b>Резюме сессии от {start_date}</b>\n\n"
+    
+    if session.summary:
+        text += session.summary
+    else:
+        text += "Резюме не было создано для этой сессии."
+    
+    _store_render('summary', session, user_id, text)
+    return text
 
 
-async def get_session_events_share(session_id: int, user_id: int) -> str:
+async def get_session_events_share(session_id: int, user_id: int, db_session: AsyncSession) -> str:
     """Get formatted events for sharing"""
-    from services.database import get_session_events, AsyncSessionLocal
-    from sqlalchemy import select
+    cached = _get_cached_render('events', session_id, user_id)
+    if cached is not None:
+        return cached
     
-    async with AsyncSessionLocal() as db_session:
-        stmt = select(CaptureSession).where(
-            CaptureSession.id == session_id,
-            CaptureSession.user_id == user_id
-        )
-        result = await db_session.execute(stmt)
-        session = result.scalar_one_or_none()
-        
-        if not session:
-            return None
-        
-        events = await get_session_events(session_id)
-        start_date = session.start_time.strftime('%d.%m.%Y %H:%M')
-        
-        text = f"📅 <b>События из сессии от {start_date}</b>\n\n"
-        
-        if events:
-            for i, event in enumerate(events, 1):
-                priority_emoji = {'high': '🔴', 'medium': '🟡', 'low': '🟢'}.get(event.priority, '⚪')
-                type_emoji = {
-                    'meeting': '👥', 'deadline': '⏰', 'task': '✅',
-                    'appointment': '📅', 'reminder': '💭'
-                }.get(event.event_type, '📝')
-                
-                text += f"{i}. {type_emoji} {priority_emoji} <b>{event.title}</b>\n"
-                if event.start_datetime:
-                    text += f"   📅 {event.start_datetime.strftime('%d.%m %H:%M')}"
-                if event.location:
-                    text += f" | 📍 {event.location}"
-                text += "\n"
-        else:
-            text += "События не были найдены в этой сессии."
-        
-        return text
+    session = await get_session_with_events(session_id, user_id, db_session)
+    
+    if not session:
+        return None
+    
+    events = session.events
+    start_date = _fmt_dt(session.start_time)
+    
+    parts = [f"📅 <b>События из сессии от {start_date}</b>\n\n"]
+    
+    if events:
+        for i, event in enumerate(events, 1):
+            prefix = _session_event_prefix(event)
+            
+            parts.append(f"{i}. {prefix} <b>{event.title}</b>\n")
+            if event.start_datetime:
+                parts.append(f"   📅 {_fmt_dt_short(event.start_datetime)}")
+            if event.location:
+                parts.append(f" | 📍 {event.location}")
+            parts.append("\n")
+    else:
+        parts.append("События не были найдены в этой сессии.")
+    
+    text = "".join(parts)
+    _store_render('events', session, user_id, text)
+    return text
 
 
-async def send_export_file(message: types.Message, content: str, filename: str, mime_type: str):
-    """Send content as a file"""
-    from aiogram.types import BufferedInputFile
-    
-    # Create file from string content
-    file_data = content.encode('utf-8')
-    file = BufferedInputFile(file_data, filename)
+async def send_export_file(message: types.Message, content: bytes, filename: str, mime_type: str):
+    """Send already encoded content as a file"""
+    file = BufferedInputFile(content, filename)
     
     await message.answer_document(
         document=file,
@@ -1250,9 +1394,8 @@ async def cq_delete_session(callback: types.CallbackQuery, state: FSMContext):
     """Handle session deletion request"""
     await callback.answer()
     
-    session_id = int(callback.data.split("_")[2])
+    session_id = int(_CB_PATTERNS['delete_session'].match(callback.data).group(1))
     
-    from keyboards.inline import get_delete_confirm_keyboard
     await callback.message.edit_text(
         f"🗑️ <b>Удаление сессии #{session_id}</b>\n\n"
         "⚠️ Это действие нельзя отменить. Все данные сессии будут удалены навсегда.\n\n"
@@ -1262,15 +1405,15 @@ async def cq_delete_session(callback: types.CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("confirm_delete_"))
-async def cq_confirm_delete(callback: types.CallbackQuery, state: FSMContext):
+async def cq_confirm_delete(callback: types.CallbackQuery, state: FSMContext, db_session: AsyncSession):
     """Confirm session deletion"""
     await callback.answer()
     
-    session_id = int(callback.data.split("_")[2])
+    session_id = int(_CB_PATTERNS['confirm_delete'].match(callback.data).group(1))
     user_id = callback.from_user.id
     
     try:
-        success = await delete_user_session(session_id, user_id)
+        success = await delete_user_session(session_id, user_id, db_session)
         if success:
             await callback.message.edit_text(
                 f"✅ Сессия #{session_id} была успешно удалена.",
@@ -1289,41 +1432,34 @@ async def cq_confirm_delete(callback: types.CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("cancel_delete_"))
-async def cq_cancel_delete(callback: types.CallbackQuery, state: FSMContext):
+async def cq_cancel_delete(callback: types.CallbackQuery, state: FSMContext, db_session: AsyncSession):
     """Cancel session deletion"""
     await callback.answer()
     
-    session_id = int(callback.data.split("_")[2])
-    await show_session_details(callback.message, callback.from_user.id, session_id)
+    session_id = int(_CB_PATTERNS['cancel_delete'].match(callback.data).group(1))
+    await show_session_details(callback.message, callback.from_user.id, session_id, db_session)
 
 
-async def delete_user_session(session_id: int, user_id: int) -> bool:
+async def delete_user_session(session_id: int, user_id: int, db_session: AsyncSession) -> bool:
     """Delete a user's session and related events"""
-    from services.database import AsyncSessionLocal
-    from sqlalchemy import select, delete
-    
-    async with AsyncSessionLocal() as db_session:
-        # First check if session belongs to user
-        stmt = select(CaptureSession).where(
-            CaptureSession.id == session_id,
-            CaptureSession.user_id == user_id
-        )
-        result = await db_session.execute(stmt)
-        session = result.scalar_one_or_none()
-        
-        if not session:
-            return False
-        
-        # Delete related events first
-        events_delete_stmt = delete(Event).where(Event.session_id == session_id)
-        await db_session.execute(events_delete_stmt)
-        
-        # Delete session
-        session_delete_stmt = delete(CaptureSession).where(CaptureSession.id == session_id)
-        await db_session.execute(session_delete_stmt)
-        
-        await db_session.commit()
-        return True
+    # Ownership check and delete in one statement — no window between them
+    session_delete_stmt = delete(CaptureSession).where(
+        CaptureSession.id == session_id,
+        CaptureSession.user_id == user_id
+    ).returning(CaptureSession.id)
+    deleted = (await db_session.execute(session_delete_stmt)).first()
+    
+    if deleted is None:
+        return False
+    
+    # events.session_id has no FK, so there is no ON DELETE CASCADE to rely on
+    events_delete_stmt = delete(Event).where(Event.session_id == session_id)
+    await db_session.execute(events_delete_stmt)
+    
+    await db_session.commit()
+    invalidate_session_render(session_id)
+    invalidate_session_events(session_id)
+    return True
 
 
 @router.callback_query(F.data == "back_to_sessions")
@@ -1335,74 +1471,123 @@ async def cq_back_to_sessions(callback: types.CallbackQuery, state: FSMContext):
     await show_user_sessions(callback.message, user_id, 1)
 
 
-async def show_event_confirmation(message: types.Message, session_id: int, events: list, user_id: int):
+def _render_confirmation_row(i: int, event) -> str:
+    """Render one event block for the confirmation screen, without its selection mark"""
+    parts = [_EVENT_ROW_TMPL.format(
+        i=i + 1,
+        pe=_PRIO_EMOJI.get(event.priority, "🟡"),
+        te=_TYPE_EMOJI.get(event.event_type, "📌"),
+        title=event.title
+    )]
+    append = parts.append
+    
+    # Show key details
+    if event.start_datetime:
+        append(f"   🕐 {_fmt_dt(event.start_datetime)}\n")
+    
+    if event.location:
+        append(f"   📍 {event.location}\n")
+    
+    participants = event.participants
+    if participants:
+        participants_str = ", ".join(participants[:2])
+        if len(participants) > 2:
+            participants_str += f" и еще {len(participants) - 2}"
+        append(f"   👥 {participants_str}\n")
+    
+    # Action items preview
+    action_items = event.action_items
+    if action_items:
+        if len(action_items) == 1:
+            item = action_items[0]
+            append(f"   ✅ {item[:50]}{'...' if len(item) > 50 else ''}\n")
+        else:
+            append(f"   ✅ {len(action_items)} задач\n")
+    
+    append("\n")
+    return "".join(parts)
+
+
+def _render_event_confirmation(session_id: int, event_rows: list, event_selection: dict) -> str:
+    """Build the full event confirmation text from pre-rendered rows and the current selection"""
+    total = len(event_rows)
+    selected_count = sum(1 for selected in event_selection.values() if selected)
+    parts = [
+        "📅 <b>Подтверждение событий</b>\n\n",
+        f"🔍 Найдено <code>{total}</code> событий в сессии #{session_id}.\n",
+        f"Выберите которые создать в календаре: <code>{selected_count}/{total}</code>\n\n"
+    ]
+    # Рядки вже відрендерені — лише додаємо позначку вибору перед кожним
+    parts.extend(
+        ("✅" if event_selection.get(f"event_{i}", True) else "☑️") + row
+        for i, row in enumerate(event_rows)
+    )
+    parts.append(_CONFIRM_FOOTER)
+    return "".join(parts)
+
+
+async def _get_confirmation_state(state: FSMContext, session_id: int) -> tuple:
+    """
+    Return (event_rendered_rows, event_selection) for the session from FSM data.
+    Falls back to the database only if the rows are missing or belong to another session
+    """
+    data = await state.get_data()
+    event_rows = data.get('event_rendered_rows')
+    
+    if event_rows is None or data.get('event_rows_session') != session_id:
+        events = await get_session_events(session_id)
+        event_rows = [_render_confirmation_row(i, event) for i, event in enumerate(events)]
+        event_selection = {f"event_{i}": True for i in range(len(event_rows))}
+        await state.update_data(
+            event_rendered_rows=event_rows,
+            event_rows_session=session_id,
+            event_selection=event_selection
+        )
+        return event_rows, event_selection
+    
+    return event_rows, data.get('event_selection') or {f"event_{i}": True for i in range(len(event_rows))}
+
+
+async def _update_event_confirmation(message: types.Message, session_id: int, event_rows: list,
+                                     event_selection: dict, state: FSMContext):
+    """Redraw the confirmation message and keyboard, skipping the edit if nothing changed"""
+    text = _render_event_confirmation(session_id, event_rows, event_selection)
+    keyboard = get_event_confirmation_keyboard(session_id, len(event_rows), event_selection)
+    
+    # Повторний клік по тому ж стану не повинен коштувати запиту до Telegram
+    rendered_hash = hashlib.blake2b(
+        f"{message.message_id}:{text}{keyboard!r}".encode(), digest_size=8
+    ).hexdigest()
+    data = await state.get_data()
+    if data.get('event_rendered_hash') == rendered_hash:
+        return
+    
+    await message.edit_text(text, reply_markup=keyboard, disable_web_page_preview=True)
+    await state.update_data(event_rendered_hash=rendered_hash)
+
+
+async def show_event_confirmation(message: types.Message, session_id: int, events: list, user_id: int, state: FSMContext):
     """
     Display events for user confirmation before creating calendar events
     """
     try:
-        # Build confirmation message
-        text = f"📅 <b>Подтверждение событий</b>\n\n"
-        text += f"🔍 Найдено <code>{len(events)}</code> событий в сессии #{session_id}.\n"
-        text += f"Выберите которые создать в календаре:\n\n"
-        
-        # Store event selection state in FSM
-        from aiogram.fsm.context import FSMContext
-        from states.capture_states import CaptureStates
-        
-        # Initialize event selection state
-        event_selection = {}
-        for i, event in enumerate(events):
-            event_selection[f"event_{i}"] = True  # All selected by default
-        
-        # Display events with selection status
-        for i, event in enumerate(events):
-            selected = "✅" if event_selection.get(f"event_{i}", True) else "☑️"
-            
-            # Priority and type indicators
-            priority_emoji = {"high": "🔴", "medium": "🟡", "low": "🟢"}.get(event.priority, "🟡")
-            type_emoji = {
-                "meeting": "🤝", "deadline": "⏰", "task": "📋", 
-                "appointment": "📅", "reminder": "🔔"
-            }.get(event.event_type, "📌")
-            
-            text += f"{selected} {i+1}. {priority_emoji}{type_emoji} <b>{event.title}</b>\n"
-            
-            # Show key details
-            if event.start_datetime:
-                dt_str = event.start_datetime.strftime("%d.%m.%Y %H:%M")
-                text += f"   🕐 {dt_str}\n"
-            
-            if event.location:
-                text += f"   📍 {event.location}\n"
-            
-            if event.participants and len(event.participants) > 0:
-                participants_str = ", ".join(event.participants[:2])
-                if len(event.participants) > 2:
-                    participants_str += f" и еще {len(event.participants)-2}"
-                text += f"   👥 {participants_str}\n"
-            
-            # Action items preview
-            if event.action_items and len(event.action_items) > 0:
-                if len(event.action_items) == 1:
-                    text += f"   ✅ {event.action_items[0][:50]}{'...' if len(event.action_items[0]) > 50 else ''}\n"
-                else:
-                    text += f"   ✅ {len(event.action_items)} задач\n"
-            
-            text += "\n"
-        
-        # Add usage instructions
-        text += f"💡 <b>Управление:</b>\n"
-        text += f"• Нажмите на номер события чтобы включить/исключить\n"
-        text += f"• Используйте кнопки для массовых операций\n"
-        
-        # Send with confirmation keyboard
-        from keyboards.inline import get_event_confirmation_keyboard
-        keyboard = get_event_confirmation_keyboard(session_id, len(events), event_selection)
+        # Rows are rendered once; later clicks only change the selection marks in front of them
+        event_rows = [_render_confirmation_row(i, event) for i, event in enumerate(events)]
+        
+        # Initialize event selection state: all selected by default
+        event_selection = {f"event_{i}": True for i in range(len(event_rows))}
+        # Повідомлення могло показувати інший екран — попередній хеш тут недійсний
+        await state.update_data(
+            event_rendered_rows=event_rows,
+            event_rows_session=session_id,
+            event_selection=event_selection,
+            event_rendered_hash=None
+        )
         
-        await message.edit_text(text, reply_markup=keyboard, disable_web_page_preview=True)
+        await _update_event_confirmation(message, session_id, event_rows, event_selection, state)
         
-    except Exception as e:
-        print(f"Error showing event confirmation: {e}")
+    except Exception:
+        logger.exception("Error showing event confirmation")
         await message.edit_text(
             f"❌ <b>Ошибка отображения событий</b>\n\n"
             f"Не удалось показать события для подтверждения."
@@ -1414,20 +1599,11 @@ async def cq_toggle_event(callback: types.CallbackQuery, state: FSMContext):
     """Toggle individual event selection"""
     try:
         # Parse callback data: toggle_event_{session_id}_{event_index}
-        parts = callback.data.split("_")
-        session_id = int(parts[2])
-        event_index = int(parts[3])
-        
-        # Get current selection state from FSM data
-        data = await state.get_data()
-        event_selection = data.get('event_selection', {})
+        match = _CB_PATTERNS['toggle_event'].match(callback.data)
+        session_id = int(match.group(1))
+        event_index = int(match.group(2))
         
-        # Initialize if not exists
-        if not event_selection:
-            # Get events count
-            from services.database import get_session_events
-            events = await get_session_events(session_id)
-            event_selection = {f"event_{i}": True for i in range(len(events))}
+        event_rows, event_selection = await _get_confirmation_state(state, session_id)
         
         # Toggle selection
         key = f"event_{event_index}"
@@ -1436,40 +1612,11 @@ async def cq_toggle_event(callback: types.CallbackQuery, state: FSMContext):
         # Save updated selection
         await state.update_data(event_selection=event_selection)
         
-        # Update keyboard to reflect change
-        selected_count = sum(1 for selected in event_selection.values() if selected)
-        total_count = len(event_selection)
-        
-        from keyboards.inline import get_event_confirmation_keyboard
-        keyboard = get_event_confirmation_keyboard(session_id, total_count, event_selection)
-        
-        # Update status text
-        text = callback.message.text
-        lines = text.split('\n')
-        
-        # Find and update the specific event line
-        for i, line in enumerate(lines):
-            if line.startswith(("✅", "☑️")) and f"{event_index+1}." in line:
-                # Toggle the checkbox
-                if line.startswith("✅"):
-                    lines[i] = line.replace("✅", "☑️", 1)
-                else:
-                    lines[i] = line.replace("☑️", "✅", 1)
-                break
-        
-        # Update selection summary
-        for i, line in enumerate(lines):
-            if "Выберите которые создать" in line:
-                lines[i] = f"Выберите которые создать в календаре: <code>{selected_count}/{total_count}</code>"
-                break
-        
-        updated_text = '\n'.join(lines)
-        
-        await callback.message.edit_text(updated_text, reply_markup=keyboard, disable_web_page_preview=True)
+        await _update_event_confirmation(callback.message, session_id, event_rows, event_selection, state)
         await callback.answer(f"Событие {'выбрано' if event_selection[key] else 'исключено'}")
         
-    except Exception as e:
-        print(f"Error toggling event selection: {e}")
+    except Exception:
+        logger.exception("Error toggling event selection")
         await callback.answer("❌ Ошибка изменения выбора")
 
 
@@ -1477,22 +1624,20 @@ async def cq_toggle_event(callback: types.CallbackQuery, state: FSMContext):
 async def cq_select_all_events(callback: types.CallbackQuery, state: FSMContext):
     """Select all events"""
     try:
-        session_id = int(callback.data.split("_")[3])
+        session_id = int(_CB_PATTERNS['select_all_events'].match(callback.data).group(1))
         
-        # Get events count
-        from services.database import get_session_events
-        events = await get_session_events(session_id)
+        event_rows, _ = await _get_confirmation_state(state, session_id)
         
         # Select all
-        event_selection = {f"event_{i}": True for i in range(len(events))}
+        event_selection = {f"event_{i}": True for i in range(len(event_rows))}
         await state.update_data(event_selection=event_selection)
         
         # Refresh display
-        await refresh_event_confirmation_display(callback.message, session_id, events, callback.from_user.id, event_selection)
+        await _update_event_confirmation(callback.message, session_id, event_rows, event_selection, state)
         await callback.answer("✅ Все события выбраны")
         
-    except Exception as e:
-        print(f"Error selecting all events: {e}")
+    except Exception:
+        logger.exception("Error selecting all events")
         await callback.answer("❌ Ошибка выбора")
 
 
@@ -1500,30 +1645,28 @@ async def cq_select_all_events(callback: types.CallbackQuery, state: FSMContext)
 async def cq_deselect_all_events(callback: types.CallbackQuery, state: FSMContext):
     """Deselect all events"""
     try:
-        session_id = int(callback.data.split("_")[3])
+        session_id = int(_CB_PATTERNS['deselect_all_events'].match(callback.data).group(1))
         
-        # Get events count
-        from services.database import get_session_events
-        events = await get_session_events(session_id)
+        event_rows, _ = await _get_confirmation_state(state, session_id)
         
         # Deselect all
-        event_selection = {f"event_{i}": False for i in range(len(events))}
+        event_selection = {f"event_{i}": False for i in range(len(event_rows))}
         await state.update_data(event_selection=event_selection)
         
         # Refresh display
-        await refresh_event_confirmation_display(callback.message, session_id, events, callback.from_user.id, event_selection)
+        await _update_event_confirmation(callback.message, session_id, event_rows, event_selection, state)
         await callback.answer("☑️ Все события исключены")
         
-    except Exception as e:
-        print(f"Error deselecting all events: {e}")
+    except Exception:
+        logger.exception("Error deselecting all events")
         await callback.answer("❌ Ошибка исключения")
 
 
 @router.callback_query(F.data.startswith("confirm_create_events_"))
-async def cq_confirm_create_events(callback: types.CallbackQuery, state: FSMContext):
+async def cq_confirm_create_events(callback: types.CallbackQuery, state: FSMContext, db_session: AsyncSession):
     """Create selected events in calendar"""
     try:
-        session_id = int(callback.data.split("_")[3])
+        session_id = int(_CB_PATTERNS['confirm_create_events'].match(callback.data).group(1))
         user_id = callback.from_user.id
         
         # Get selection state
@@ -1531,8 +1674,7 @@ async def cq_confirm_create_events(callback: types.CallbackQuery, state: FSMCont
         event_selection = data.get('event_selection', {})
         
         # Get all events
-        from services.database import get_session_events
-        events = await get_session_events(session_id)
+        events = await get_session_events(session_id, db_session)
         
         # Filter selected events
         selected_events = []
@@ -1547,174 +1689,122 @@ async def cq_confirm_create_events(callback: types.CallbackQuery, state: FSMCont
             )
             return
         
-        # Show progress
-        await callback.message.edit_text(
+        # Show progress; later updates are throttled to stay under Telegram's edit rate limit
+        progress = ProgressThrottler(callback.message)
+        await progress.update(
             f"📅 <b>Создание событий...</b>\n\n"
             f"🔄 Создаём {len(selected_events)} событий в календаре"
         )
         
-        # Create events one by one
+        async def report_progress(done: int, total: int):
+            await progress.update(
+                f"📅 <b>Создание событий...</b>\n\n"
+                f"🔄 Обработано <code>{done}/{total}</code>"
+            )
+        
+        # Convert Event models to dicts for API
+        events_data = [
+            {
+                'title': event.title,
+                'event_type': event.event_type,
+                'priority': event.priority,
+                'start_datetime': event.start_datetime.isoformat() if event.start_datetime else None,
+                'end_datetime': event.end_datetime.isoformat() if event.end_datetime else None,
+                'location': event.location,
+                'participants': event.participants or [],
+                'action_items': event.action_items or [],
+                'session_id': session_id
+            }
+            for event in selected_events
+        ]
+        
+        # All inserts go out in Calendar batch requests instead of one round-trip per event
+        results = await google_calendar.create_calendar_events_batch(
+            user_id, events_data, on_progress=report_progress
+        )
+        
         created_events = []
         failed_events = []
+        calendar_id_updates = []
         
-        for event in selected_events:
-            try:
-                # Convert Event model to dict for API
-                event_data = {
+        for event, (calendar_event_id, error) in zip(selected_events, results):
+            if calendar_event_id:
+                calendar_id_updates.append({'id': event.id, 'calendar_event_id': calendar_event_id})
+                created_events.append({
+                    'event_id': event.id,
                     'title': event.title,
-                    'event_type': event.event_type,
-                    'priority': event.priority,
-                    'start_datetime': event.start_datetime.isoformat() if event.start_datetime else None,
-                    'end_datetime': event.end_datetime.isoformat() if event.end_datetime else None,
-                    'location': event.location,
-                    'participants': event.participants or [],
-                    'action_items': event.action_items or [],
-                    'session_id': session_id
-                }
-                
-                # Create calendar event
-                calendar_event_id = await google_calendar.create_calendar_event(user_id, event_data)
-                
-                if calendar_event_id:
-                    # Update database with calendar event ID
-                    from services.database import AsyncSessionLocal, Event
-                    async with AsyncSessionLocal() as db_session:
-                        db_event = await db_session.get(Event, event.id)
-                        if db_event:
-                            db_event.calendar_event_id = calendar_event_id
-                            await db_session.commit()
-                    
-                    created_events.append({
-                        'event_id': event.id,
-                        'title': event.title,
-                        'calendar_event_id': calendar_event_id
-                    })
-                else:
-                    failed_events.append({
-                        'event_id': event.id,
-                        'title': event.title,
-                        'error': 'Failed to create calendar event'
-                    })
-            
-            except Exception as event_error:
-                print(f"Error creating calendar event for {event.title}: {event_error}")
+                    'calendar_event_id': calendar_event_id
+                })
+            else:
+                logger.warning("Error creating calendar event for %s: %s", event.title, error)
                 failed_events.append({
                     'event_id': event.id,
                     'title': event.title,
-                    'error': str(event_error)
+                    'error': error or 'Failed to create calendar event'
                 })
         
+        if calendar_id_updates:
+            # Update database with calendar event IDs: one bulk UPDATE by primary key, one commit
+            await db_session.execute(update(Event), calendar_id_updates)
+            await db_session.commit()
+        
+        if created_events:
+            invalidate_session_events(session_id)
+        
         # Show results
         await show_creation_results(callback.message, created_events, failed_events)
         
         # Clear selection state
-        await state.update_data(event_selection={})
+        await state.update_data(
+            event_selection={}, event_rendered_rows=None, event_rows_session=None, event_rendered_hash=None
+        )
         
-    except Exception as e:
-        print(f"Error creating selected events: {e}")
+    except Exception:
+        logger.exception("Error creating selected events")
         await callback.message.edit_text(
             f"❌ <b>Ошибка создания событий</b>\n\n"
             f"Произошла ошибка при создании событий в календаре."
         )
 
 
-async def refresh_event_confirmation_display(message: types.Message, session_id: int, events: list, user_id: int, event_selection: dict):
-    """Refresh the event confirmation display with updated selection"""
-    try:
-        # Rebuild the display
-        text = f"📅 <b>Подтверждение событий</b>\n\n"
-        selected_count = sum(1 for selected in event_selection.values() if selected)
-        text += f"🔍 Найдено <code>{len(events)}</code> событий в сессии #{session_id}.\n"
-        text += f"Выберите которые создать в календаре: <code>{selected_count}/{len(events)}</code>\n\n"
-        
-        # Display events with current selection
-        for i, event in enumerate(events):
-            selected = "✅" if event_selection.get(f"event_{i}", True) else "☑️"
-            
-            # Priority and type indicators
-            priority_emoji = {"high": "🔴", "medium": "🟡", "low": "🟢"}.get(event.priority, "🟡")
-            type_emoji = {
-                "meeting": "🤝", "deadline": "⏰", "task": "📋", 
-                "appointment": "📅", "reminder": "🔔"
-            }.get(event.event_type, "📌")
-            
-            text += f"{selected} {i+1}. {priority_emoji}{type_emoji} <b>{event.title}</b>\n"
-            
-            # Show key details
-            if event.start_datetime:
-                dt_str = event.start_datetime.strftime("%d.%m.%Y %H:%M")
-                text += f"   🕐 {dt_str}\n"
-            
-            if event.location:
-                text += f"   📍 {event.location}\n"
-            
-            if event.participants and len(event.participants) > 0:
-                participants_str = ", ".join(event.participants[:2])
-                if len(event.participants) > 2:
-                    participants_str += f" и еще {len(event.participants)-2}"
-                text += f"   👥 {participants_str}\n"
-            
-            if event.action_items and len(event.action_items) > 0:
-                if len(event.action_items) == 1:
-                    text += f"   ✅ {event.action_items[0][:50]}{'...' if len(event.action_items[0]) > 50 else ''}\n"
-                else:
-                    text += f"   ✅ {len(event.action_items)} задач\n"
-            
-            text += "\n"
-        
-        # Add usage instructions
-        text += f"💡 <b>Управление:</b>\n"
-        text += f"• Нажмите на номер события чтобы включить/исключить\n"
-        text += f"• Используйте кнопки для массовых операций\n"
-        
-        # Update with new keyboard
-        from keyboards.inline import get_event_confirmation_keyboard
-        keyboard = get_event_confirmation_keyboard(session_id, len(events), event_selection)
-        
-        await message.edit_text(text, reply_markup=keyboard, disable_web_page_preview=True)
-        
-    except Exception as e:
-        print(f"Error refreshing confirmation display: {e}")
-
-
 async def show_creation_results(message: types.Message, created_events: list, failed_events: list):
     """Show results of calendar event creation"""
     try:
-        result_text = f"📅 <b>Результаты создания событий</b>\n\n"
+        parts = ["📅 <b>Результаты создания событий</b>\n\n"]
         
         if created_events:
-            result_text += f"✅ <b>Успешно создано: {len(created_events)}</b>\n"
-            for event in created_events:
-                result_text += f"  📌 {event['title']}\n"
-            result_text += "\n"
+            parts.append(f"✅ <b>Успешно создано: {len(created_events)}</b>\n")
+            parts.extend(f"  📌 {event['title']}\n" for event in created_events)
+            parts.append("\n")
         
         if failed_events:
-            result_text += f"❌ <b>Не удалось создать: {len(failed_events)}</b>\n"
+            parts.append(f"❌ <b>Не удалось создать: {len(failed_events)}</b>\n")
             for event in failed_events:
                 error_msg = event.get('error', 'Неизвестная ошибка')
                 if len(error_msg) > 100:
                     error_msg = error_msg[:100] + "..."
-                result_text += f"  ❌ {event['title']}: {error_msg}\n"
-            result_text += "\n"
+                parts.append(f"  ❌ {event['title']}: {error_msg}\n")
+            parts.append("\n")
         
         # Summary
         total_attempted = len(created_events) + len(failed_events)
         success_rate = (len(created_events) / total_attempted * 100) if total_attempted > 0 else 0
         
-        result_text += f"📊 <b>Итого:</b> {success_rate:.0f}% успешно ({len(created_events)}/{total_attempted})\n\n"
+        parts.append(f"📊 <b>Итого:</b> {success_rate:.0f}% успешно ({len(created_events)}/{total_attempted})\n\n")
         
         if created_events:
-            result_text += f"💡 Откройте Google Calendar чтобы просмотреть созданные события.\n"
+            parts.append("💡 Откройте Google Calendar чтобы просмотреть созданные события.\n")
         
         if failed_events:
-            result_text += f"💡 Проверьте подключение календаря: /connect_calendar\n"
+            parts.append("💡 Проверьте подключение календаря: /connect_calendar\n")
         
-        result_text += f"📚 История сессий: /my_sessions"
+        parts.append("📚 История сессий: /my_sessions")
+        result_text = "".join(parts)
         
         await message.edit_text(result_text, disable_web_page_preview=True)
         
-    except Exception as e:
-        print(f"Error showing creation results: {e}")
+    except Exception:
+        logger.exception("Error showing creation results")
         await message.edit_text(
             f"✅ <b>События созданы!</b>\n\n"
             f"📊 Успешно: {len(created_events)}, ошибок: {len(failed_events)}\n"
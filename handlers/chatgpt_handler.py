@@ -2,18 +2,33 @@
 ChatGPT Handler - Direct interaction with OpenAI ChatGPT
 Allows users to chat directly with GPT using /ask command
 """
+import asyncio
 import logging
+import time
+from functools import cache
 from aiogram import Router, types, F
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from services.analysis import GPTAnalysisService
+from services.analysis import gpt_analysis
+from config import CHATGPT_STREAM_EDIT_INTERVAL_SECONDS
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 
+async def _retry_after(make_call):
+    """Run a Telegram API call, waiting out one flood-control RetryAfter before retrying"""
+    try:
+        return await make_call()
+    except TelegramRetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        return await make_call()
+
+
 class ChatGPTStates(StatesGroup):
     """States for ChatGPT conversation"""
     CHATTING = State()
@@ -35,10 +50,7 @@ async def cmd_ask_chatgpt(message: types.Message, state: FSMContext):
         await state.clear()  # Clean previous state
         
         # Check if prompt provided with command
-        if not message.text:
-            message.text = "/ask"
-        
-        prompt_text = message.text[4:].strip()  # Remove "/ask "
+        prompt_text = (message.text or "").removeprefix("/ask").strip()
         
         if prompt_text:
             # Prompt provided directly with command
@@ -114,6 +126,16 @@ async def process_chatgpt_request(message: types.Message, user_prompt: str, stat
         )
         return
     
+    # Shared service instance: its AsyncOpenAI client keeps the HTTP connection pool between requests.
+    # Перевіряємо до прогрес-повідомлення, щоб при помилці конфігурації надіслати лише одне повідомлення
+    if not gpt_analysis.client:
+        await message.answer(
+            "❌ **OpenAI API не налаштований**\n\n"
+            "Для використання ChatGPT потрібен API ключ OpenAI.\n\n"
+            "💡 Використайте /summary для G4F (безкоштовного) резюме."
+        )
+        return
+    
     # Show progress
     progress_message = await message.answer(
         "🤖 **ChatGPT думає...**\n\n"
@@ -123,20 +145,9 @@ async def process_chatgpt_request(message: types.Message, user_prompt: str, stat
     )
     
     try:
-        # Use OpenAI GPT service for direct conversation
-        gpt_service = GPTAnalysisService()
-        
-        if not gpt_service.client:
-            await progress_message.edit_text(
-                "❌ **OpenAI API не налаштований**\n\n"
-                "Для використання ChatGPT потрібен API ключ OpenAI.\n\n"
-                "💡 Використайте /summary для G4F (безкоштовного) резюме."
-            )
-            return
-        
         # Create conversation with ChatGPT
         try:
-            response = await gpt_service.client.chat.completions.create(
+            response = await gpt_analysis.client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {
@@ -152,10 +163,37 @@ async def process_chatgpt_request(message: types.Message, user_prompt: str, stat
                 ],
                 max_tokens=1000,
                 temperature=0.7,
-                timeout=30.0
+                timeout=30.0,
+                stream=True
             )
             
-            chatgpt_response = response.choices[0].message.content
+            # Показуємо відповідь по мірі генерації, редагуючи повідомлення не частіше за інтервал
+            chunks = []
+            last_edit = 0.0
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                chunks.append(delta)
+                
+                now = time.monotonic()
+                if now - last_edit >= CHATGPT_STREAM_EDIT_INTERVAL_SECONDS:
+                    last_edit = now
+                    partial = "".join(chunks)
+                    if len(partial) <= 4000:
+                        try:
+                            # Незавершений текст може мати розірвану розмітку — шлемо без parse_mode
+                            await progress_message.edit_text(f"🤖 {partial} ▌", parse_mode=None)
+                        except TelegramRetryAfter as flood_error:
+                            # Flood limit: чекаємо, скільки просить Telegram, і рахуємо інтервал від кінця паузи
+                            await asyncio.sleep(flood_error.retry_after)
+                            last_edit = time.monotonic()
+                        except TelegramBadRequest as edit_error:
+                            logger.debug("Stream edit skipped: %s", edit_error)
+            
+            chatgpt_response = "".join(chunks)
             
             if not keep_chat_mode:
                 await state.clear()
@@ -167,25 +205,26 @@ async def process_chatgpt_request(message: types.Message, user_prompt: str, stat
                 f"💭 **Ваш запит:** {user_prompt[:100]}{'...' if len(user_prompt) > 100 else ''}"
             )
             
-            # Delete progress message
-            try:
-                await progress_message.delete()
-            except:
-                pass
-            
             # Send result with keyboard
             keyboard = create_chatgpt_result_keyboard(keep_chat_mode)
             
             # Split long responses
             if len(result_text) > 4000:
+                # Delete progress message
+                try:
+                    await progress_message.delete()
+                except TelegramBadRequest:
+                    pass
+                
                 # Send response part by part
-                await message.answer(f"🤖 **ChatGPT відповідь:**\n\n{chatgpt_response}")
-                await message.answer(
+                await _retry_after(lambda: message.answer(f"🤖 **ChatGPT відповідь:**\n\n{chatgpt_response}"))
+                await _retry_after(lambda: message.answer(
                     f"💭 **Ваш запит:** {user_prompt[:200]}{'...' if len(user_prompt) > 200 else ''}",
                     reply_markup=keyboard
-                )
+                ))
             else:
-                await message.answer(result_text, reply_markup=keyboard)
+                # Final edit of the streamed message
+                await _retry_after(lambda: progress_message.edit_text(result_text, reply_markup=keyboard))
             
             logger.info(f"✅ ChatGPT response sent to user {user_id}: {len(chatgpt_response)} chars")
             
@@ -195,7 +234,7 @@ async def process_chatgpt_request(message: types.Message, user_prompt: str, stat
             # Delete progress message
             try:
                 await progress_message.delete()
-            except:
+            except TelegramBadRequest:
                 pass
             
             await message.answer(
@@ -214,7 +253,7 @@ async def process_chatgpt_request(message: types.Message, user_prompt: str, stat
         # Delete progress message
         try:
             await progress_message.delete()
-        except:
+        except TelegramBadRequest:
             pass
         
         await message.answer(
@@ -280,10 +319,9 @@ async def cq_exit_chat(callback: types.CallbackQuery, state: FSMContext):
 # HELPER FUNCTIONS
 # ==============================================
 
+@cache  # static layout: built once, same markup reused
 def create_chatgpt_keyboard():
     """Create keyboard for ChatGPT chat mode"""
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
-    
     builder = InlineKeyboardBuilder()
     builder.button(text="❌ Завершити чат", callback_data="exit_chat")
     builder.button(text="ℹ️ Поради", callback_data="chatgpt_tips")
@@ -291,10 +329,9 @@ def create_chatgpt_keyboard():
     return builder.as_markup()
 
 
+@cache  # only two variants, each built once
 def create_chatgpt_result_keyboard(chat_mode: bool = False):
     """Create keyboard for ChatGPT result"""
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
-    
     builder = InlineKeyboardBuilder()
     
     if chat_mode:
@@ -13,7 +13,7 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from states.user_states import CaptureStates, EventEditStates
 from services.enhanced_capture_flow import EnhancedCaptureFlow
 from services.session_manager import SessionManager
-from services.database import get_active_session
+from services.database import get_active_session_info
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -35,10 +35,10 @@ async def cmd_start_enhanced_capture(message: types.Message, state: FSMContext):
         await state.clear()
         
         # Check for existing sessions
-        existing_session = await get_active_session(user_id)
+        existing_session = await get_active_session_info(user_id)
         if existing_session:
             # User has active session
-            message_count = len(existing_session.messages) if existing_session.messages else 0
+            message_count = existing_session.message_count
             
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
                 [
@@ -180,7 +180,7 @@ async def handle_enhanced_captured_message(message: types.Message, state: FSMCon
         
         # Add to session if we have valid text
         if message_text.strip():
-            success = await SessionManager.add_message_to_session(user_id, message_text, state)
+            success, _ = await SessionManager.add_message_to_session(user_id, message_text, state)
             
             if success:
                 # Update message count
@@ -44,11 +44,10 @@ async def cq_extract_events_simple(callback: types.CallbackQuery, state: FSMCont
         
         # Simple event extraction using existing GPT service
         try:
-            from services.analysis import GPTAnalysisService
-            gpt_service = GPTAnalysisService()
+            from services.analysis import gpt_analysis
             
             # Use existing summarization to extract key points
-            summary = await gpt_service.generate_summary_only(last_text)
+            summary = await gpt_analysis.generate_summary_only(last_text)
             
             # Simple heuristic to detect if events are present
             event_keywords = ["зустріч", "дзвінок", "нарада", "презентація", "дедлайн", "завтра", "сьогодні", 
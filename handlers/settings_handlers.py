@@ -15,6 +15,7 @@ from keyboards.inline import (get_language_keyboard,
                               get_data_retention_keyboard)
 from states.user_states import SettingsStates
 from services.database import get_user_calendar_status, get_user_setting, update_user_setting, disconnect_user_calendar, cleanup_user_data
+from services.google_oauth import google_oauth
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -283,6 +284,7 @@ async def cq_confirm_disconnect_calendar(callback: types.CallbackQuery, state: F
         success = await disconnect_user_calendar(user_id)
         
         if success:
+            google_oauth.invalidate_connection_cache(user_id)
             await callback.answer("🔌 Календарь отключен")
             
             # Show updated calendar settings
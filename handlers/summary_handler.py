@@ -7,7 +7,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from aiogram.fsm.state import State, StatesGroup
 
-from services.analysis import GPTAnalysisService
+from services.analysis import gpt_analysis
 from config import SUMMARY_STYLES
 
 logger = logging.getLogger(__name__)
@@ -126,8 +126,7 @@ async def process_summary_request(message: types.Message, input_text: str, state
         user_summary_style = await get_user_summary_style(user_id)
         
         # Create summary using GPT service
-        gpt_service = GPTAnalysisService()
-        summary = await gpt_service.generate_summary_only(input_text)
+        summary = await gpt_analysis.generate_summary_only(input_text)
         
         # Clear FSM state
         await state.clear()
@@ -1,8 +1,11 @@
+from functools import cache
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import SUPPORTED_LANGUAGES, SUMMARY_STYLES
 
 
+@cache  # static layout: built once, same markup reused
 def get_main_settings_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="🗣️ Язык транскрибации", callback_data="settings:language")
@@ -36,6 +39,7 @@ def get_summary_style_keyboard(current_style: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cache  # static layout: built once, same markup reused
 def get_cancel_keyboard() -> InlineKeyboardMarkup:
     buttons = [
         [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_state")]
@@ -43,6 +47,7 @@ def get_cancel_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@cache  # static layout: built once, same markup reused
 def get_capture_session_keyboard() -> InlineKeyboardMarkup:
     """Keyboard for active capture session"""
     buttons = [
@@ -153,6 +158,7 @@ def get_calendar_connection_keyboard(auth_url: str, state: str) -> InlineKeyboar
     return builder.as_markup()
 
 
+@cache  # static layout: built once, same markup reused
 def get_calendar_disconnect_keyboard() -> InlineKeyboardMarkup:
     """Keyboard for connected calendar management"""
     builder = InlineKeyboardBuilder()
@@ -188,6 +194,7 @@ def get_calendar_list_keyboard(calendars: list, current_calendar_id: str = None)
     return builder.as_markup()
 
 
+@cache  # static layout: built once, same markup reused
 def get_oauth_instructions_keyboard() -> InlineKeyboardMarkup:
     """Instructions keyboard for OAuth flow"""
     builder = InlineKeyboardBuilder()
@@ -379,6 +386,7 @@ def get_data_retention_keyboard(retention_days: int = 30) -> InlineKeyboardMarku
     return builder.as_markup()
 
 
+@cache  # static layout: built once, same markup reused
 def get_auto_create_confirmation_keyboard() -> InlineKeyboardMarkup:
     """Confirmation keyboard for auto-create toggle"""
     builder = InlineKeyboardBuilder()
@@ -390,6 +398,7 @@ def get_auto_create_confirmation_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@cache  # static layout: built once, same markup reused
 def get_disconnect_calendar_confirmation_keyboard() -> InlineKeyboardMarkup:
     """Confirmation keyboard for calendar disconnection"""
     builder = InlineKeyboardBuilder()
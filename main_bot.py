@@ -2,6 +2,8 @@
 import asyncio
 import os
 import logging
+import logging.handlers
+import queue
 import sys
 from typing import Callable, Dict, Any, Awaitable
 
@@ -15,7 +17,7 @@ from dotenv import load_dotenv
 from handlers import common_handlers, settings_handlers, voice_audio_handler, text_input_handler, capture_handlers, calendar_handlers
 from keyboards.command_menu import set_main_menu
 from services.transcription import load_whisper_model
-from services.database import init_database
+from services.database import init_database, AsyncSessionLocal
 from services.google_oauth import oauth_cleanup_task
 from config import TELEGRAM_BOT_TOKEN
 
@@ -45,6 +47,21 @@ class DataMiddleware(BaseMiddleware):
         return await handler(event, data)
 
 
+class DbSessionMiddleware(BaseMiddleware):
+    """Give every handler of one update the same db_session"""
+
+    async def __call__(
+        self,
+        handler: Callable[[types.TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: types.TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        # З'єднання з пулу береться лише при першому запиті, тож апдейти без БД нічого не платять
+        async with AsyncSessionLocal() as db_session:
+            data["db_session"] = db_session
+            return await handler(event, data)
+
+
 async def main():
     load_dotenv()
 
@@ -74,6 +91,10 @@ async def main():
     dp.callback_query.middleware(middleware)
     dp.inline_query.middleware(middleware)
 
+    db_session_middleware = DbSessionMiddleware()
+    dp.message.middleware(db_session_middleware)
+    dp.callback_query.middleware(db_session_middleware)
+
     await set_main_menu(bot)
 
     # Register routers in order of priority
@@ -129,10 +150,20 @@ async def main():
     asyncio.create_task(oauth_cleanup_task())
 
     # Enhanced logging setup
+    # Handlers only put records on a queue; the blocking stdout write happens
+    # in the listener thread, not inside the event loop
+    log_queue = queue.SimpleQueue()
+    log_output = logging.StreamHandler()
+    log_output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    log_listener = logging.handlers.QueueListener(log_queue, log_output)
+    # force=True: services.oauth_server already called basicConfig on import,
+    # without it the queue handler would be silently ignored
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        handlers=[logging.handlers.QueueHandler(log_queue)],
+        force=True
     )
+    log_listener.start()
     
     # Set specific loggers for debugging
     logging.getLogger("aiogram").setLevel(logging.INFO)
@@ -143,6 +174,7 @@ async def main():
         await dp.start_polling(bot)
     finally:
         await bot.session.close()
+        log_listener.stop()
 
 
 if __name__ == "__main__":
@@ -6,7 +6,7 @@ import json
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 from openai import AsyncOpenAI, APIError, RateLimitError, APIConnectionError
 
 from config import OPENAI_API_KEY
@@ -67,14 +67,7 @@ class GPTAnalysisService:
                 system_prompt = self._get_analysis_prompt()
                 
                 # Extract phone numbers before GPT analysis
-                try:
-                    from .phone_extractor import phone_extractor
-                    phones = phone_extractor.extract_phones(conversation_text)
-                    phone_context = ""
-                    if phones:
-                        phone_context = f"\n\nВИТЯГНУТІ ТЕЛЕФОНИ:\n{phone_extractor.format_for_display(phones)}"
-                except:
-                    phone_context = ""
+                phone_context = self._phone_context(conversation_text)
 
                 # Call GPT for analysis
                 response = await self.client.chat.completions.create(
@@ -154,12 +147,23 @@ class GPTAnalysisService:
             "events": []
         }
     
+    def _phone_context(self, conversation_text: str) -> str:
+        """Extracted phone numbers appended to the user prompt"""
+        try:
+            from .phone_extractor import phone_extractor
+            phones = phone_extractor.extract_phones(conversation_text)
+            if phones:
+                return f"\n\nВИТЯГНУТІ ТЕЛЕФОНИ:\n{phone_extractor.format_for_display(phones)}"
+        except:
+            pass
+        return ""
+    
     async def _save_events_to_db(self, events: List[Dict], session_id: int, user_id: int):
         """
         Save extracted events to database
         """
         try:
-            from .database import AsyncSessionLocal, Event
+            from .database import AsyncSessionLocal, Event, invalidate_session_events
             
             async with AsyncSessionLocal() as session:
                 for event_data in events:
@@ -185,6 +189,7 @@ class GPTAnalysisService:
                     session.add(event)
                 
                 await session.commit()
+                invalidate_session_events(session_id)
                 logger.info(f"Successfully saved {len(events)} events to database")
                 
         except Exception as e:
@@ -308,63 +313,9 @@ class GPTAnalysisService:
     def _parse_analysis_result(self, result_text: str) -> Dict:
         """Parse GPT response and extract structured data with enhanced validation"""
         try:
-            # Try to find JSON in the response
-            result_text = result_text.strip()
-            
-            # Remove markdown code blocks if present
-            if result_text.startswith("```json"):
-                result_text = result_text[7:]
-            if result_text.endswith("```"):
-                result_text = result_text[:-3]
-            
-            # Additional cleanup
-            result_text = result_text.strip()
-            
             # Parse JSON
-            parsed = json.loads(result_text)
-            
-            # Validate structure
-            if not isinstance(parsed, dict):
-                raise ValueError("Response is not a dictionary")
-            
-            summary = parsed.get("summary", "Не удалось извлечь резюме")
-            events = parsed.get("events", [])
-            
-            # Enhanced validation for events
-            validated_events = []
-            for i, event in enumerate(events):
-                if not isinstance(event, dict):
-                    logger.warning(f"Event {i} is not a dictionary, skipping")
-                    continue
-                    
-                if not event.get("title"):
-                    logger.warning(f"Event {i} has no title, skipping")
-                    continue
-                
-                # Validate and sanitize fields
-                validated_event = {
-                    "title": str(event.get("title", "")).strip(),
-                    "date": self._validate_date(event.get("date")),
-                    "time": self._validate_time(event.get("time")),
-                    "location": str(event.get("location", "")).strip() if event.get("location") else None,
-                    "participants": self._validate_list(event.get("participants")),
-                    "action_items": self._validate_list(event.get("action_items")),
-                    "type": self._validate_event_type(event.get("type")),
-                    "priority": self._validate_priority(event.get("priority"))
-                }
-                
-                # Only add if title is not empty after sanitization
-                if validated_event["title"]:
-                    validated_events.append(validated_event)
-                else:
-                    logger.warning(f"Event {i} has empty title after validation, skipping")
-            
-            logger.info(f"Successfully validated {len(validated_events)} events from GPT response")
-            
-            return {
-                "summary": summary.strip() if summary else "Не удалось извлечь резюме",
-                "events": validated_events
-            }
+            parsed = json.loads(self._strip_code_fence(result_text))
+            return self._build_analysis_result(parsed)
             
         except json.JSONDecodeError as e:
             logger.error(f"JSON parsing error: {e}")
@@ -379,6 +330,61 @@ class GPTAnalysisService:
                 "events": []
             }
     
+    def _strip_code_fence(self, result_text: str) -> str:
+        """Remove markdown code blocks around a JSON answer"""
+        result_text = result_text.strip()
+        
+        if result_text.startswith("```json"):
+            result_text = result_text[7:]
+        if result_text.endswith("```"):
+            result_text = result_text[:-3]
+        
+        return result_text.strip()
+    
+    def _build_analysis_result(self, parsed) -> Dict:
+        """Validate one parsed {summary, events} object"""
+        if not isinstance(parsed, dict):
+            raise ValueError("Response is not a dictionary")
+        
+        summary = parsed.get("summary", "Не удалось извлечь резюме")
+        events = parsed.get("events", [])
+        
+        # Enhanced validation for events
+        validated_events = []
+        for i, event in enumerate(events):
+            if not isinstance(event, dict):
+                logger.warning(f"Event {i} is not a dictionary, skipping")
+                continue
+                
+            if not event.get("title"):
+                logger.warning(f"Event {i} has no title, skipping")
+                continue
+            
+            # Validate and sanitize fields
+            validated_event = {
+                "title": str(event.get("title", "")).strip(),
+                "date": self._validate_date(event.get("date")),
+                "time": self._validate_time(event.get("time")),
+                "location": str(event.get("location", "")).strip() if event.get("location") else None,
+                "participants": self._validate_list(event.get("participants")),
+                "action_items": self._validate_list(event.get("action_items")),
+                "type": self._validate_event_type(event.get("type")),
+                "priority": self._validate_priority(event.get("priority"))
+            }
+            
+            # Only add if title is not empty after sanitization
+            if validated_event["title"]:
+                validated_events.append(validated_event)
+            else:
+                logger.warning(f"Event {i} has empty title after validation, skipping")
+        
+        logger.info(f"Successfully validated {len(validated_events)} events from GPT response")
+        
+        return {
+            "summary": summary.strip() if summary else "Не удалось извлечь резюме",
+            "events": validated_events
+        }
+    
     def _validate_date(self, date_value) -> Optional[str]:
         """Validate date string format"""
         if not date_value:
@@ -462,6 +468,16 @@ class GPTAnalysisService:
         priority_str = str(priority_value).strip().lower()
         return priority_str if priority_str in valid_priorities else "medium"
     
+    def _summary_messages(self, text: str) -> List[Dict]:
+        """Chat messages for the summary-only prompt"""
+        return [
+            {
+                "role": "system", 
+                "content": "Создай краткое резюме предоставленного текста на русском языке. Выдели основные темы и важные моменты."
+            },
+            {"role": "user", "content": text}
+        ]
+    
     async def generate_summary_only(self, text: str) -> str:
         """
         Generate only summary without event extraction (faster)
@@ -472,13 +488,7 @@ class GPTAnalysisService:
         try:
             response = await self.client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Создай краткое резюме предоставленного текста на русском языке. Выдели основные темы и важные моменты."
-                    },
-                    {"role": "user", "content": text}
-                ],
+                messages=self._summary_messages(text),
                 max_tokens=500,
                 temperature=0.3
             )
@@ -488,6 +498,30 @@ class GPTAnalysisService:
         except Exception as e:
             return f"❌ Ошибка при создании резюме: {str(e)}"
     
+    async def stream_summary(self, text: str) -> AsyncIterator[str]:
+        """
+        Same as generate_summary_only, but yields text pieces as the model produces them
+        """
+        if not self.client:
+            yield "❌ Ошибка: OpenAI API key не настроен"
+            return
+        
+        try:
+            stream = await self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=self._summary_messages(text),
+                max_tokens=500,
+                temperature=0.3,
+                stream=True
+            )
+            
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                    
+        except Exception as e:
+            yield f"❌ Ошибка при создании резюме: {str(e)}"
+    
     def get_prompt_examples(self) -> List[Dict]:
         """
         Get example conversations for testing prompt accuracy
@@ -563,4 +597,4 @@ class GPTAnalysisService:
 
 
 # Global instance
-gpt_analysis = GPTAnalysisService() 
\ No newline at end of file
+gpt_analysis = GPTAnalysisService()
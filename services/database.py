@@ -2,13 +2,15 @@
 Database models and setup for Telegram bot capture sessions
 """
 import json
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, JSON, create_engine, select, desc, func, or_, delete
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, relationship, selectinload, raiseload
 
 Base = declarative_base()
 
@@ -26,6 +28,14 @@ class CaptureSession(Base):
     extracted_events = Column(JSON, nullable=True, default=list)  # List of extracted events
     status = Column(String(20), nullable=False, default='active')  # active, completed, failed
     
+    # Події сесії (read-only, без FK у схемі) — для завантаження разом із сесією через selectinload
+    events = relationship(
+        'Event',
+        primaryjoin='CaptureSession.id == foreign(Event.session_id)',
+        order_by='Event.start_datetime',
+        viewonly=True
+    )
+    
     def add_message(self, message_text: str):
         """Add a message to the session"""
         if self.messages is None:
@@ -84,6 +94,14 @@ class UserSettings(Base):
     updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+# How many summary characters the session list shows
+SESSION_SUMMARY_PREVIEW_LENGTH = 100
+
+# Події сесії: session_id -> (events, cached_at). Екран вибору подій читає їх на кожен клік
+_session_events_cache: Dict[int, tuple] = {}
+SESSION_EVENTS_CACHE_TTL = 30  # seconds
+SESSION_EVENTS_CACHE_MAX = 1024
+
 # Database setup
 DATABASE_URL = "sqlite+aiosqlite:///./bot_data.db"
 
@@ -113,6 +131,16 @@ async def get_db_session() -> AsyncSession:
             await session.close()
 
 
+@asynccontextmanager
+async def _session_scope(db_session: Optional[AsyncSession] = None):
+    """Reuse the caller's session if one is given, otherwise open a short-lived one"""
+    if db_session is not None:
+        yield db_session
+        return
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
 # Database helper functions
 async def get_user_settings(user_id: int) -> Optional[UserSettings]:
     """Get user settings or create default ones"""
@@ -138,6 +166,24 @@ async def get_active_session(user_id: int) -> Optional[CaptureSession]:
         return result.scalar_one_or_none()
 
 
+async def get_active_session_info(user_id: int):
+    """
+    Get id, start_time and message_count of the user's active capture session.
+    Messages are counted in SQL, so the messages JSON is not loaded
+    """
+    async with AsyncSessionLocal() as session:
+        stmt = select(
+            CaptureSession.id,
+            CaptureSession.start_time,
+            func.coalesce(func.json_array_length(CaptureSession.messages), 0).label('message_count')
+        ).where(
+            CaptureSession.user_id == user_id,
+            CaptureSession.status == 'active'
+        )
+        result = await session.execute(stmt)
+        return result.one_or_none()
+
+
 async def create_capture_session(user_id: int) -> CaptureSession:
     """Create new capture session"""
     async with AsyncSessionLocal() as session:
@@ -166,14 +212,25 @@ async def get_user_sessions_paginated(
     per_page: int = 10, 
     status_filter: Optional[str] = None,
     search_query: Optional[str] = None
-) -> tuple[List[CaptureSession], int]:
+) -> tuple[list, int]:
     """
     Get user's capture sessions with pagination and filtering
-    Returns (sessions, total_count)
+    Returns (rows, total_count); rows carry id, status, start_time, end_time,
+    summary_preview, summary_length, message_count and events_count
+    so the messages/events JSON is never loaded for the list view
     """
     async with AsyncSessionLocal() as session:
         # Base query
-        base_stmt = select(CaptureSession).where(CaptureSession.user_id == user_id)
+        base_stmt = select(
+            CaptureSession.id,
+            CaptureSession.status,
+            CaptureSession.start_time,
+            CaptureSession.end_time,
+            func.substr(CaptureSession.summary, 1, SESSION_SUMMARY_PREVIEW_LENGTH).label('summary_preview'),
+            func.length(CaptureSession.summary).label('summary_length'),
+            func.coalesce(func.json_array_length(CaptureSession.messages), 0).label('message_count'),
+            func.coalesce(func.json_array_length(CaptureSession.extracted_events), 0).label('events_count')
+        ).where(CaptureSession.user_id == user_id)
         count_stmt = select(func.count(CaptureSession.id)).where(CaptureSession.user_id == user_id)
         
         # Apply status filter
@@ -200,17 +257,86 @@ async def get_user_sessions_paginated(
         
         # Execute query
         sessions_result = await session.execute(sessions_stmt)
-        sessions = sessions_result.scalars().all()
+        sessions = sessions_result.all()
         
         return list(sessions), total_count
 
 
-async def get_session_events(session_id: int) -> List['Event']:
-    """Get all events for a specific session"""
+async def get_session_events(session_id: int, db_session: Optional[AsyncSession] = None) -> List['Event']:
+    """Get all events for a specific session (cached for SESSION_EVENTS_CACHE_TTL seconds)"""
+    cached = _session_events_cache.get(session_id)
+    if cached and time.monotonic() - cached[1] < SESSION_EVENTS_CACHE_TTL:
+        return cached[0]
+    
+    async with _session_scope(db_session) as session:
+        stmt = select(Event).options(raiseload('*')).where(
+            Event.session_id == session_id
+        ).order_by(Event.start_datetime)
+        result = await session.execute(stmt)
+        events = result.scalars().all()
+    
+    now = time.monotonic()
+    if len(_session_events_cache) >= SESSION_EVENTS_CACHE_MAX:
+        for key in [k for k, (_, ts) in _session_events_cache.items() if now - ts >= SESSION_EVENTS_CACHE_TTL]:
+            del _session_events_cache[key]
+        if len(_session_events_cache) >= SESSION_EVENTS_CACHE_MAX:
+            # Все ще повний — викидаємо найстаріший запис
+            del _session_events_cache[next(iter(_session_events_cache))]
+    _session_events_cache[session_id] = (events, now)
+    return events
+
+
+def invalidate_session_events(session_id: Optional[int] = None):
+    """Forget cached events of a session (or of all sessions) - call after events change"""
+    if session_id is None:
+        _session_events_cache.clear()
+    else:
+        _session_events_cache.pop(session_id, None)
+
+
+async def get_session_with_events(
+    session_id: int,
+    user_id: int,
+    db_session: Optional[AsyncSession] = None
+) -> Optional[CaptureSession]:
+    """
+    Get a user's session with its events already loaded in session.events
+    Returns None if the session doesn't exist or belongs to someone else
+    """
+    async with _session_scope(db_session) as session:
+        # raiseload: будь-яке інше lazy-завантаження — помилка, а не тихий зайвий запит
+        stmt = select(CaptureSession).options(
+            selectinload(CaptureSession.events),
+            raiseload('*')
+        ).where(
+            CaptureSession.id == session_id,
+            CaptureSession.user_id == user_id
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
+
+
+async def get_session_events_with_calendar(session_id: int, user_id: int) -> tuple[List['Event'], bool]:
+    """
+    Get the user's events for a session together with their calendar connection flag
+    in a single query. Returns (events, calendar_connected)
+    """
+    calendar_connected = select(func.count(UserSettings.user_id)).where(
+        UserSettings.user_id == user_id,
+        UserSettings.google_calendar_connected.is_(True),
+        UserSettings.google_refresh_token.isnot(None)
+    ).scalar_subquery()
+    
     async with AsyncSessionLocal() as session:
-        stmt = select(Event).where(Event.session_id == session_id).order_by(Event.start_datetime)
+        stmt = select(Event, calendar_connected.label('calendar_connected')).where(
+            Event.session_id == session_id,
+            Event.user_id == user_id
+        ).order_by(Event.start_datetime)
         result = await session.execute(stmt)
-        return result.scalars().all()
+        rows = result.all()
+        
+        events = [row[0] for row in rows]
+        return events, bool(rows and rows[0][1])
 
 
 async def get_user_stats(user_id: int) -> dict:
@@ -284,6 +410,8 @@ async def cleanup_old_sessions(days_to_keep: int = 30) -> int:
                 await session.execute(sessions_delete_stmt)
                 
                 await session.commit()
+                for session_id in old_session_ids:
+                    invalidate_session_events(session_id)
         
         return delete_count
 
@@ -456,6 +584,8 @@ async def cleanup_user_data(user_id: int, retention_days: int) -> dict:
                 deleted_sessions = sessions_result.rowcount
                 
                 await session.commit()
+                for session_id in old_session_ids:
+                    invalidate_session_events(session_id)
         
         return {
             'deleted_sessions': deleted_sessions,
@@ -12,7 +12,7 @@ from aiogram import types
 from aiogram.fsm.context import FSMContext
 
 from states.user_states import CaptureStates, EventEditStates
-from services.analysis import GPTAnalysisService
+from services.analysis import gpt_analysis
 from services.phone_extractor import phone_extractor
 from services.google_calendar import create_calendar_event
 
@@ -51,7 +51,7 @@ class EnhancedCaptureFlow:
     """Service for managing enhanced capture flow with UX improvements"""
     
     def __init__(self):
-        self.gpt_service = GPTAnalysisService()
+        self.gpt_service = gpt_analysis
     
     async def start_analysis(
         self, 
@@ -2,8 +2,11 @@
 Google Calendar API service for managing calendar events
 """
 import asyncio
+import logging
+import random
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
 import pytz
 from dateutil import parser as date_parser
 
@@ -11,12 +14,50 @@ from google.auth.exceptions import RefreshError
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from google_auth_httplib2 import AuthorizedHttp
 import aiohttp
+from sqlalchemy import update
 
 from services.google_oauth import google_oauth
 from services.database import AsyncSessionLocal, Event, UserSettings
 from config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET
 
+logger = logging.getLogger(__name__)
+
+
+# Calendar API accepts at most 50 calls in one batch request
+CALENDAR_BATCH_MAX_REQUESTS = 50
+# Parallel single inserts when a batch request fails; keeps us under the per-user QPS limit
+CALENDAR_MAX_CONCURRENT_INSERTS = 5
+# Google радить повторювати rate limit (403/429) і тимчасові помилки сервера з експоненційним backoff
+CALENDAR_RETRY_STATUSES = frozenset({403, 429, 500, 502, 503, 504})
+CALENDAR_RETRY_MAX_ATTEMPTS = 5
+CALENDAR_RETRY_MAX_DELAY_SECONDS = 32
+# Загальний ліміт часу на всі повтори одного виклику
+CALENDAR_RETRY_DEADLINE_SECONDS = 60
+CALENDAR_AUTH_EXPIRED_MESSAGE = "Authentication expired. Please reconnect your calendar."
+
+
+def _is_retriable_error(error: Exception) -> bool:
+    """Rate limit and transient server errors that Google asks clients to retry with backoff"""
+    if not isinstance(error, HttpError) or error.resp.status not in CALENDAR_RETRY_STATUSES:
+        return False
+    if error.resp.status == 403:
+        # 403 також означає відсутність доступу — повторюємо лише rateLimitExceeded/userRateLimitExceeded
+        return 'ratelimitexceeded' in str(error.content).lower()
+    return True
+
+
+def _is_auth_error(error: Exception) -> bool:
+    """Expired or revoked credentials: the cached service must be dropped"""
+    return isinstance(error, RefreshError) or (isinstance(error, HttpError) and error.resp.status == 401)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter for the given zero-based retry attempt"""
+    return min(2 ** attempt + random.random(), CALENDAR_RETRY_MAX_DELAY_SECONDS)
+
 
 class GoogleCalendarService:
     """Handle Google Calendar API operations"""
@@ -25,13 +66,17 @@ class GoogleCalendarService:
         self.client_id = GOOGLE_CLIENT_ID
         self.client_secret = GOOGLE_CLIENT_SECRET
         
-        # Cache for calendar services to avoid recreating
+        # Cache of (service, credentials) per user to avoid recreating
         self._service_cache = {}
-        self._rate_limit_delay = 1  # Start with 1 second delay
-        self._max_retry_attempts = 3
+        self._max_retry_attempts = CALENDAR_RETRY_MAX_ATTEMPTS
     
     async def _get_calendar_service(self, user_id: int):
         """Get authenticated Calendar API service for user"""
+        service, _ = await self._get_calendar_client(user_id)
+        return service
+    
+    async def _get_calendar_client(self, user_id: int) -> Tuple[Any, Credentials]:
+        """Get authenticated Calendar API service for user together with its credentials"""
         if user_id in self._service_cache:
             return self._service_cache[user_id]
         
@@ -51,7 +96,7 @@ class GoogleCalendarService:
         service = build('calendar', 'v3', credentials=credentials)
         
         # Cache the service (but not for too long due to token expiry)
-        self._service_cache[user_id] = service
+        self._service_cache[user_id] = (service, credentials)
         
         # Clear cache after 30 minutes
         async def clear_cache():
@@ -60,50 +105,40 @@ class GoogleCalendarService:
         
         asyncio.create_task(clear_cache())
         
-        return service
+        return service, credentials
     
     async def _handle_api_call(self, api_call, max_retries: int = None):
         """Handle API call with rate limiting and retry logic"""
         if max_retries is None:
             max_retries = self._max_retry_attempts
         
+        deadline = time.monotonic() + CALENDAR_RETRY_DEADLINE_SECONDS
         for attempt in range(max_retries):
             try:
-                # Add delay for rate limiting
-                if attempt > 0:
-                    await asyncio.sleep(self._rate_limit_delay * (2 ** attempt))
-                
                 # Execute API call
-                result = api_call.execute()
-                
-                # Reset rate limit delay on success
-                self._rate_limit_delay = max(1, self._rate_limit_delay * 0.9)
-                
-                return result
+                return api_call.execute()
             
             except HttpError as e:
-                if e.resp.status == 429:  # Rate limited
-                    self._rate_limit_delay = min(60, self._rate_limit_delay * 2)
-                    if attempt < max_retries - 1:
-                        print(f"Rate limited, retrying in {self._rate_limit_delay} seconds...")
-                        continue
-                elif e.resp.status == 401:  # Unauthorized
+                if e.resp.status == 401:  # Unauthorized
                     # Clear cached service and raise auth error
                     user_id = getattr(api_call, '_user_id', None)
                     if user_id:
                         self._service_cache.pop(user_id, None)
-                    raise ValueError("Authentication expired. Please reconnect your calendar.")
-                elif e.resp.status >= 500:  # Server error
-                    if attempt < max_retries - 1:
-                        print(f"Server error {e.resp.status}, retrying...")
-                        continue
+                    raise ValueError(CALENDAR_AUTH_EXPIRED_MESSAGE)
+                
+                delay = _backoff_delay(attempt)
+                if (_is_retriable_error(e) and attempt < max_retries - 1
+                        and time.monotonic() + delay < deadline):
+                    logger.warning("Calendar API error %s, retrying in %.1f seconds...", e.resp.status, delay)
+                    await asyncio.sleep(delay)
+                    continue
                 
                 # Re-raise for other errors
                 raise e
             
             except RefreshError:
                 # Token refresh failed
-                raise ValueError("Authentication expired. Please reconnect your calendar.")
+                raise ValueError(CALENDAR_AUTH_EXPIRED_MESSAGE)
         
         raise Exception(f"API call failed after {max_retries} attempts")
     
@@ -129,8 +164,8 @@ class GoogleCalendarService:
             
             return calendars
         
-        except Exception as e:
-            print(f"Error getting calendars for user {user_id}: {e}")
+        except Exception:
+            logger.exception("Error getting calendars for user %s", user_id)
             return []
     
     async def get_primary_calendar_id(self, user_id: int) -> Optional[str]:
@@ -149,8 +184,8 @@ class GoogleCalendarService:
             
             return None
         
-        except Exception as e:
-            print(f"Error getting primary calendar for user {user_id}: {e}")
+        except Exception:
+            logger.exception("Error getting primary calendar for user %s", user_id)
             return None
     
     def _format_datetime_for_api(self, dt: datetime, timezone: str = 'UTC') -> Dict[str, str]:
@@ -178,7 +213,7 @@ class GoogleCalendarService:
             return dt
         
         except Exception as e:
-            print(f"Error parsing datetime '{event_datetime}': {e}")
+            logger.warning("Error parsing datetime '%s': %s", event_datetime, e)
             # Return current time as fallback
             return datetime.now(pytz.UTC)
     
@@ -202,60 +237,8 @@ class GoogleCalendarService:
             if not calendar_id:
                 raise ValueError("No calendar available for user")
             
-            # Get user timezone
-            async with AsyncSessionLocal() as session:
-                user_settings = await session.get(UserSettings, user_id)
-                user_timezone = 'UTC'  # Default timezone
-                
-                if user_settings and user_settings.calendar_id:
-                    # Try to get timezone from calendar settings
-                    calendars = await self.get_user_calendars(user_id)
-                    for cal in calendars:
-                        if cal['id'] == user_settings.calendar_id:
-                            user_timezone = cal.get('timezone', 'UTC')
-                            break
-            
-            # Parse event times
-            start_time = self._parse_event_datetime(
-                event_data.get('start_datetime'), 
-                user_timezone
-            )
-            
-            end_time = None
-            if event_data.get('end_datetime'):
-                end_time = self._parse_event_datetime(
-                    event_data.get('end_datetime'), 
-                    user_timezone
-                )
-            else:
-                # Default 1 hour duration
-                end_time = start_time + timedelta(hours=1)
-            
-            # Build event body
-            event_body = {
-                'summary': event_data.get('title', 'Captured Event'),
-                'description': self._build_event_description(event_data),
-                'start': self._format_datetime_for_api(start_time, user_timezone),
-                'end': self._format_datetime_for_api(end_time, user_timezone),
-            }
-            
-            # Add location if available
-            if event_data.get('location'):
-                event_body['location'] = event_data['location']
-            
-            # Add attendees if available
-            if event_data.get('participants'):
-                attendees = []
-                for participant in event_data['participants']:
-                    # Simple email detection
-                    if '@' in participant:
-                        attendees.append({'email': participant})
-                    else:
-                        # Store as display name (Google will handle properly)
-                        attendees.append({'displayName': participant})
-                
-                if attendees:
-                    event_body['attendees'] = attendees
+            user_timezone = await self._get_user_timezone(user_id)
+            event_body = self._build_event_body(event_data, user_timezone)
             
             # Create event
             create_call = service.events().insert(calendarId=calendar_id, body=event_body)
@@ -264,14 +247,245 @@ class GoogleCalendarService:
             result = await self._handle_api_call(create_call)
             
             event_id = result.get('id')
-            print(f"Created calendar event {event_id} for user {user_id}")
+            logger.info("Created calendar event %s for user %s", event_id, user_id)
             
             return event_id
         
-        except Exception as e:
-            print(f"Error creating calendar event for user {user_id}: {e}")
+        except Exception:
+            logger.exception("Error creating calendar event for user %s", user_id)
             return None
     
+    async def create_calendar_events_batch(
+        self,
+        user_id: int,
+        events_data: List[Dict[str, Any]],
+        calendar_id: Optional[str] = None,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        Create several events with Calendar batch requests (one HTTP round-trip per 50 events)
+        on_progress(done, total) is awaited as events get processed
+        Returns: (event_id, error) per input event, in the same order
+        """
+        results: List[Tuple[Optional[str], Optional[str]]] = [(None, 'Not sent')] * len(events_data)
+        if not events_data:
+            return results
+        
+        try:
+            service, credentials = await self._get_calendar_client(user_id)
+            
+            # Calendar and timezone are resolved once for the whole batch
+            if not calendar_id:
+                calendar_id = await self.get_primary_calendar_id(user_id)
+            
+            if not calendar_id:
+                raise ValueError("No calendar available for user")
+            
+            user_timezone = await self._get_user_timezone(user_id)
+        except Exception as e:
+            logger.exception("Error preparing calendar batch for user %s", user_id)
+            return [(None, str(e))] * len(events_data)
+        
+        retriable = set()
+        auth_expired = False
+        
+        def on_response(request_id, response, exception):
+            index = int(request_id)
+            if exception is None:
+                results[index] = (response.get('id'), None)
+            elif _is_auth_error(exception):
+                results[index] = (None, CALENDAR_AUTH_EXPIRED_MESSAGE)
+            else:
+                results[index] = (None, str(exception))
+                if _is_retriable_error(exception):
+                    retriable.add(index)
+        
+        for offset in range(0, len(events_data), CALENDAR_BATCH_MAX_REQUESTS):
+            chunk = events_data[offset:offset + CALENDAR_BATCH_MAX_REQUESTS]
+            batch = service.new_batch_http_request(callback=on_response)
+            bodies = []
+            for index, event_data in enumerate(chunk, offset):
+                try:
+                    event_body = self._build_event_body(event_data, user_timezone)
+                except Exception as e:
+                    results[index] = (None, str(e))
+                    continue
+                bodies.append((index, event_body))
+                batch.add(
+                    service.events().insert(calendarId=calendar_id, body=event_body),
+                    request_id=str(index)
+                )
+            
+            try:
+                # googleapiclient блокуючий — виконуємо батч поза event loop
+                await asyncio.to_thread(batch.execute)
+            except Exception as e:
+                if _is_auth_error(e):
+                    auth_expired = True
+                    break
+                logger.warning("Calendar batch request failed for user %s, sending events one by one: %s", user_id, e)
+                # Батч не пройшов цілком — ті самі вставки паралельно, але з обмеженням
+                pending = [(index, body) for index, body in bodies if results[index][0] is None]
+                done_before = offset + len(chunk) - len(pending)
+                
+                async def report(done_in_chunk):
+                    if on_progress:
+                        await on_progress(done_before + done_in_chunk, len(events_data))
+                
+                for index, result in await self._insert_events_concurrently(
+                    user_id, service, credentials, calendar_id, pending, report
+                ):
+                    results[index] = result
+            else:
+                # Окремі вставки батчу впали на rate limit — повторюємо лише їх, з backoff
+                pending = [(index, body) for index, body in bodies if index in retriable]
+                if pending:
+                    logger.warning("Retrying %s rate-limited calendar inserts for user %s", len(pending), user_id)
+                    for index, result in await self._insert_events_concurrently(
+                        user_id, service, credentials, calendar_id, pending, start_attempt=1
+                    ):
+                        results[index] = result
+            
+            if any(results[index][1] == CALENDAR_AUTH_EXPIRED_MESSAGE for index, _ in bodies):
+                # Токен більше не дійсний — решта вставок впаде так само
+                auth_expired = True
+                break
+            
+            if on_progress:
+                await on_progress(offset + len(chunk), len(events_data))
+        
+        if auth_expired:
+            # Як і в _handle_api_call: прибираємо сервіс з простроченим токеном з кешу
+            logger.warning("Calendar credentials expired for user %s during batch insert", user_id)
+            self._service_cache.pop(user_id, None)
+            results = [
+                (None, CALENDAR_AUTH_EXPIRED_MESSAGE) if result == (None, 'Not sent') else result
+                for result in results
+            ]
+        
+        created = sum(1 for event_id, _ in results if event_id)
+        logger.info("Created %s/%s calendar events for user %s in batch", created, len(events_data), user_id)
+        return results
+    
+    async def _insert_events_concurrently(
+        self,
+        user_id: int,
+        service,
+        credentials: Credentials,
+        calendar_id: str,
+        bodies: List[Tuple[int, Dict[str, Any]]],
+        on_done: Optional[Callable[[int], Awaitable[None]]] = None,
+        start_attempt: int = 0
+    ) -> List[Tuple[int, Tuple[Optional[str], Optional[str]]]]:
+        """
+        Insert events as separate requests, at most CALENDAR_MAX_CONCURRENT_INSERTS at a time
+        Retriable errors are retried with exponential backoff; start_attempt > 0 means
+        the events already failed once and the first request waits out a backoff delay.
+        An auth error drops the user's cached service, like _handle_api_call does
+        on_done(finished_count) is awaited after each request completes
+        Returns: (index, (event_id, error)) for each (index, body)
+        """
+        semaphore = asyncio.Semaphore(CALENDAR_MAX_CONCURRENT_INSERTS)
+        deadline = time.monotonic() + CALENDAR_RETRY_DEADLINE_SECONDS
+        finished = 0
+        
+        async def insert_one(body):
+            nonlocal finished
+            async with semaphore:
+                try:
+                    # httplib2.Http не потокобезпечний — кожен потік отримує власний
+                    http = AuthorizedHttp(credentials, http=build_http())
+                    request = service.events().insert(calendarId=calendar_id, body=body)
+                    delay = _backoff_delay(start_attempt - 1) if start_attempt else 0
+                    for attempt in range(start_attempt, CALENDAR_RETRY_MAX_ATTEMPTS):
+                        if delay:
+                            await asyncio.sleep(delay)
+                        try:
+                            result = await asyncio.to_thread(request.execute, http=http)
+                            return result.get('id')
+                        except (HttpError, RefreshError) as e:
+                            if _is_auth_error(e):
+                                self._service_cache.pop(user_id, None)
+                                raise ValueError(CALENDAR_AUTH_EXPIRED_MESSAGE)
+                            delay = _backoff_delay(attempt)
+                            if (not _is_retriable_error(e) or attempt == CALENDAR_RETRY_MAX_ATTEMPTS - 1
+                                    or time.monotonic() + delay > deadline):
+                                raise
+                finally:
+                    finished += 1
+                    if on_done:
+                        await on_done(finished)
+        
+        outcomes = await asyncio.gather(
+            *(insert_one(body) for _, body in bodies),
+            return_exceptions=True
+        )
+        
+        return [
+            (index, (None, str(outcome)) if isinstance(outcome, Exception) else (outcome, None))
+            for (index, _), outcome in zip(bodies, outcomes)
+        ]
+    
+    async def _get_user_timezone(self, user_id: int) -> str:
+        """Timezone of the user's selected calendar, UTC by default"""
+        async with AsyncSessionLocal() as session:
+            user_settings = await session.get(UserSettings, user_id)
+        
+        if user_settings and user_settings.calendar_id:
+            # Try to get timezone from calendar settings
+            calendars = await self.get_user_calendars(user_id)
+            for cal in calendars:
+                if cal['id'] == user_settings.calendar_id:
+                    return cal.get('timezone', 'UTC')
+        
+        return 'UTC'
+    
+    def _build_event_body(self, event_data: Dict[str, Any], user_timezone: str) -> Dict[str, Any]:
+        """Build the Calendar API event resource from extracted event data"""
+        # Parse event times
+        start_time = self._parse_event_datetime(
+            event_data.get('start_datetime'), 
+            user_timezone
+        )
+        
+        end_time = None
+        if event_data.get('end_datetime'):
+            end_time = self._parse_event_datetime(
+                event_data.get('end_datetime'), 
+                user_timezone
+            )
+        else:
+            # Default 1 hour duration
+            end_time = start_time + timedelta(hours=1)
+        
+        # Build event body
+        event_body = {
+            'summary': event_data.get('title', 'Captured Event'),
+            'description': self._build_event_description(event_data),
+            'start': self._format_datetime_for_api(start_time, user_timezone),
+            'end': self._format_datetime_for_api(end_time, user_timezone),
+        }
+        
+        # Add location if available
+        if event_data.get('location'):
+            event_body['location'] = event_data['location']
+        
+        # Add attendees if available
+        if event_data.get('participants'):
+            attendees = []
+            for participant in event_data['participants']:
+                # Simple email detection
+                if '@' in participant:
+                    attendees.append({'email': participant})
+                else:
+                    # Store as display name (Google will handle properly)
+                    attendees.append({'displayName': participant})
+            
+            if attendees:
+                event_body['attendees'] = attendees
+        
+        return event_body
+    
     def _build_event_description(self, event_data: Dict[str, Any]) -> str:
         """Build event description from extracted event data"""
         description_parts = []
@@ -347,8 +561,8 @@ class GoogleCalendarService:
             
             return conflicts
         
-        except Exception as e:
-            print(f"Error checking conflicts for user {user_id}: {e}")
+        except Exception:
+            logger.exception("Error checking conflicts for user %s", user_id)
             return []
     
     async def update_calendar_event(
@@ -394,11 +608,11 @@ class GoogleCalendarService:
             
             await self._handle_api_call(update_call)
             
-            print(f"Updated calendar event {event_id} for user {user_id}")
+            logger.info("Updated calendar event %s for user %s", event_id, user_id)
             return True
         
-        except Exception as e:
-            print(f"Error updating calendar event {event_id} for user {user_id}: {e}")
+        except Exception:
+            logger.exception("Error updating calendar event %s for user %s", event_id, user_id)
             return False
     
     async def delete_calendar_event(
@@ -423,11 +637,11 @@ class GoogleCalendarService:
             
             await self._handle_api_call(delete_call)
             
-            print(f"Deleted calendar event {event_id} for user {user_id}")
+            logger.info("Deleted calendar event %s for user %s", event_id, user_id)
             return True
         
-        except Exception as e:
-            print(f"Error deleting calendar event {event_id} for user {user_id}: {e}")
+        except Exception:
+            logger.exception("Error deleting calendar event %s for user %s", event_id, user_id)
             return False
     
     async def sync_session_events_to_calendar(self, user_id: int, session_id: int) -> Dict[str, Any]:
@@ -447,7 +661,7 @@ class GoogleCalendarService:
                 }
             
             # Get session events from database
-            from services.database import get_session_events
+            from services.database import get_session_events, invalidate_session_events
             events = await get_session_events(session_id)
             
             if not events:
@@ -460,6 +674,7 @@ class GoogleCalendarService:
             
             created_events = []
             failed_events = []
+            calendar_id_updates = []
             
             for event in events:
                 # Convert Event model to dict for API
@@ -479,13 +694,7 @@ class GoogleCalendarService:
                 calendar_event_id = await self.create_calendar_event(user_id, event_data)
                 
                 if calendar_event_id:
-                    # Update database with calendar event ID
-                    async with AsyncSessionLocal() as db_session:
-                        db_event = await db_session.get(Event, event.id)
-                        if db_event:
-                            db_event.calendar_event_id = calendar_event_id
-                            await db_session.commit()
-                    
+                    calendar_id_updates.append({'id': event.id, 'calendar_event_id': calendar_event_id})
                     created_events.append({
                         'event_id': event.id,
                         'title': event.title,
@@ -498,6 +707,15 @@ class GoogleCalendarService:
                         'error': 'Failed to create calendar event'
                     })
             
+            if calendar_id_updates:
+                # Update database with calendar event IDs: one bulk UPDATE by primary key, one commit
+                async with AsyncSessionLocal() as db_session:
+                    await db_session.execute(update(Event), calendar_id_updates)
+                    await db_session.commit()
+                
+                # Кешовані події ще без calendar_event_id
+                invalidate_session_events(session_id)
+            
             return {
                 'success': True,
                 'created_events': created_events,
@@ -508,7 +726,7 @@ class GoogleCalendarService:
             }
         
         except Exception as e:
-            print(f"Error syncing session {session_id} events for user {user_id}: {e}")
+            logger.exception("Error syncing session %s events for user %s", session_id, user_id)
             return {
                 'success': False,
                 'error': str(e),
@@ -3,6 +3,7 @@ Google OAuth 2.0 service for Calendar API access
 """
 import secrets
 import asyncio
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from urllib.parse import urlencode
@@ -16,6 +17,8 @@ from config import (
     GOOGLE_REDIRECT_URI,
     GOOGLE_SCOPES,
     OAUTH_STATE_EXPIRY_MINUTES,
+    CALENDAR_STATUS_CACHE_TTL_SECONDS,
+    OAUTH_EXCHANGE_DEDUP_SECONDS,
     ENCRYPTION_KEY
 )
 from services.database import AsyncSessionLocal, UserSettings
@@ -41,6 +44,14 @@ class GoogleOAuthService:
         
         # In-memory store for OAuth states (temporary)
         self.oauth_states: Dict[str, Dict[str, Any]] = {}
+        
+        # In-memory cache of connection status: user_id -> (connected, checked_at)
+        self._connected_cache: Dict[int, tuple[bool, float]] = {}
+        
+        # Recent successful code exchanges: (code, state) -> (tokens, exchanged_at).
+        # Duplicate button clicks reuse the result instead of failing on a spent code
+        self._recent_exchanges: Dict[tuple[str, str], tuple[Dict[str, Any], float]] = {}
+        self._exchange_locks: Dict[tuple[str, str], asyncio.Lock] = {}
     
     def generate_auth_url(self, user_id: int) -> tuple[str, str]:
         """
@@ -73,8 +84,39 @@ class GoogleOAuthService:
     async def exchange_code_for_tokens(self, code: str, state: str) -> Optional[Dict[str, Any]]:
         """
         Exchange authorization code for access and refresh tokens
+        Concurrent or repeated calls with the same code share one exchange
         Returns: token_data or None if failed
         """
+        key = (code, state)
+        tokens = self._get_recent_exchange(key)
+        if tokens:
+            return tokens
+        
+        # Лок живе, поки результат не потрапив у _recent_exchanges: інакше конкурентний
+        # виклик створив би другий лок для того ж коду і запустив ще один обмін
+        lock = self._exchange_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another click may have finished the exchange while we waited
+            tokens = self._get_recent_exchange(key)
+            if tokens:
+                return tokens
+            
+            tokens = await self._request_tokens(code, state)
+            if tokens:
+                self._recent_exchanges[key] = (tokens, time.monotonic())
+                # Далі на повтори відповідає кеш — лок більше не потрібен
+                self._exchange_locks.pop(key, None)
+            return tokens
+    
+    def _get_recent_exchange(self, key: tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Return tokens from an exchange of the same code within the dedup window"""
+        cached = self._recent_exchanges.get(key)
+        if cached and time.monotonic() - cached[1] < OAUTH_EXCHANGE_DEDUP_SECONDS:
+            return cached[0]
+        return None
+    
+    async def _request_tokens(self, code: str, state: str) -> Optional[Dict[str, Any]]:
+        """Validate state and call Google's token endpoint"""
         # Validate state
         if state not in self.oauth_states:
             return None
@@ -140,6 +182,7 @@ class GoogleOAuthService:
                 user_settings.updated_at = datetime.utcnow()
                 
                 await session.commit()
+                self.invalidate_connection_cache(user_id)
                 return True
                 
         except Exception as e:
@@ -220,6 +263,7 @@ class GoogleOAuthService:
                     user_settings.updated_at = datetime.utcnow()
                     await db_session.commit()
             
+            self.invalidate_connection_cache(user_id)
             return True
             
         except Exception as e:
@@ -227,11 +271,15 @@ class GoogleOAuthService:
             return False
     
     async def check_user_connected(self, user_id: int) -> bool:
-        """Check if user has connected Google Calendar"""
+        """Check if user has connected Google Calendar (cached for a short TTL)"""
+        cached = self._connected_cache.get(user_id)
+        if cached and time.monotonic() - cached[1] < CALENDAR_STATUS_CACHE_TTL_SECONDS:
+            return cached[0]
+        
         try:
             async with AsyncSessionLocal() as session:
                 user_settings = await session.get(UserSettings, user_id)
-                return (
+                is_connected = bool(
                     user_settings and 
                     user_settings.google_calendar_connected and 
                     user_settings.google_refresh_token is not None
@@ -239,6 +287,13 @@ class GoogleOAuthService:
         except Exception as e:
             print(f"Error checking connection: {e}")
             return False
+        
+        self._connected_cache[user_id] = (is_connected, time.monotonic())
+        return is_connected
+    
+    def invalidate_connection_cache(self, user_id: int):
+        """Forget cached connection status so the next check hits the database"""
+        self._connected_cache.pop(user_id, None)
     
     def cleanup_expired_states(self):
         """Clean up expired OAuth states"""
@@ -251,6 +306,18 @@ class GoogleOAuthService:
         for state in expired_states:
             del self.oauth_states[state]
         
+        # Drop deduplicated exchange results past their window
+        now = time.monotonic()
+        for key in [
+            key for key, (_, exchanged_at) in self._recent_exchanges.items()
+            if now - exchanged_at >= OAUTH_EXCHANGE_DEDUP_SECONDS
+        ]:
+            del self._recent_exchanges[key]
+        
+        # Locks left by failed exchanges are dropped once nobody holds them
+        for key in [key for key, lock in self._exchange_locks.items() if not lock.locked()]:
+            del self._exchange_locks[key]
+        
         if expired_states:
             print(f"Cleaned up {len(expired_states)} expired OAuth states")
 
@@ -1,7 +1,8 @@
 """
 Session Manager Service - handles capture session state management
 """
-from typing import Optional
+import logging
+from typing import Optional, Tuple
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 
@@ -13,6 +14,8 @@ from services.database import (
     AsyncSessionLocal
 )
 
+logger = logging.getLogger(__name__)
+
 
 class SessionManager:
     """Manages capture session states and transitions"""
@@ -40,8 +43,8 @@ class SessionManager:
             
             return session
             
-        except Exception as e:
-            print(f"Error starting capture session: {e}")
+        except Exception:
+            logger.exception("Error starting capture session")
             return None
     
     @staticmethod
@@ -49,10 +52,10 @@ class SessionManager:
         user_id: int, 
         message_text: str, 
         state: FSMContext
-    ) -> bool:
+    ) -> Tuple[bool, int]:
         """
         Add message to active capture session
-        Returns True if message was added successfully
+        Returns (success, message_count) so callers don't re-fetch the session
         """
         try:
             # Get state data
@@ -60,24 +63,25 @@ class SessionManager:
             session_id = state_data.get('session_id')
             
             if not session_id:
-                return False
+                return False, 0
             
             # Get session from database
             async with AsyncSessionLocal() as db_session:
                 capture_session = await db_session.get(CaptureSession, session_id)
                 
                 if not capture_session or capture_session.status != 'active':
-                    return False
+                    return False, 0
                 
                 # Add message to session
                 capture_session.add_message(message_text)
+                message_count = len(capture_session.messages)
                 await db_session.commit()
                 
-                return True
+                return True, message_count
                 
-        except Exception as e:
-            print(f"Error adding message to session: {e}")
-            return False
+        except Exception:
+            logger.exception("Error adding message to session")
+            return False, 0
     
     @staticmethod
     async def end_capture_session(user_id: int, state: FSMContext) -> Optional[CaptureSession]:
@@ -111,8 +115,8 @@ class SessionManager:
                 
                 return capture_session
                 
-        except Exception as e:
-            print(f"Error ending capture session: {e}")
+        except Exception:
+            logger.exception("Error ending capture session")
             return None
     
     @staticmethod
@@ -153,8 +157,8 @@ class SessionManager:
                 
                 return True
                 
-        except Exception as e:
-            print(f"Error completing session processing: {e}")
+        except Exception:
+            logger.exception("Error completing session processing")
             return False
     
     @staticmethod
@@ -179,8 +183,8 @@ class SessionManager:
             await state.clear()
             return True
             
-        except Exception as e:
-            print(f"Error canceling session: {e}")
+        except Exception:
+            logger.exception("Error canceling session")
             return False
     
     @staticmethod
@@ -197,8 +201,8 @@ class SessionManager:
                 'current_state': current_state,
                 'message_count': state_data.get('message_count', 0)
             }
-        except Exception as e:
-            print(f"Error getting session info: {e}")
+        except Exception:
+            logger.exception("Error getting session info")
             return {}
     
     @staticmethod 
@@ -223,8 +227,8 @@ class SessionManager:
                 await db_session.execute(stmt)
                 await db_session.commit()
                 
-        except Exception as e:
-            print(f"Error cleaning up expired sessions: {e}")
+        except Exception:
+            logger.exception("Error cleaning up expired sessions")
 
 
 # Create global instance
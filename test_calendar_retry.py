@@ -0,0 +1,58 @@
+"""
+Tests for the Google Calendar retry policy
+"""
+import httplib2
+import pytest
+from google.auth.exceptions import RefreshError
+from googleapiclient.errors import HttpError
+
+import services.google_calendar as google_calendar
+from services.google_calendar import (
+    CALENDAR_RETRY_MAX_DELAY_SECONDS,
+    _backoff_delay,
+    _is_retriable_error,
+)
+
+RATE_LIMIT_CONTENT = b'{"error": {"errors": [{"reason": "rateLimitExceeded"}], "code": 403}}'
+USER_RATE_LIMIT_CONTENT = b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}], "code": 403}}'
+FORBIDDEN_CONTENT = b'{"error": {"errors": [{"reason": "forbidden"}], "code": 403}}'
+
+
+def _http_error(status, content=b'{}'):
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+@pytest.mark.parametrize("content", [RATE_LIMIT_CONTENT, USER_RATE_LIMIT_CONTENT])
+def test_rate_limited_403_is_retried(content):
+    assert _is_retriable_error(_http_error(403, content))
+
+
+def test_forbidden_403_is_not_retried():
+    assert not _is_retriable_error(_http_error(403, FORBIDDEN_CONTENT))
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_rate_limit_and_server_errors_are_retried(status):
+    assert _is_retriable_error(_http_error(status))
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 409])
+def test_client_errors_are_not_retried(status):
+    assert not _is_retriable_error(_http_error(status))
+
+
+@pytest.mark.parametrize("error", [ValueError("boom"), TimeoutError(), RefreshError("expired")])
+def test_non_http_errors_are_not_retried(error):
+    assert not _is_retriable_error(error)
+
+
+@pytest.mark.parametrize("attempt", [0, 1, 2, 3, 4])
+def test_backoff_grows_exponentially_with_jitter(attempt):
+    delay = _backoff_delay(attempt)
+    assert 2 ** attempt <= delay < 2 ** attempt + 1
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(google_calendar.random, "random", lambda: 0.999)
+    assert _backoff_delay(5) == CALENDAR_RETRY_MAX_DELAY_SECONDS
+    assert _backoff_delay(20) == CALENDAR_RETRY_MAX_DELAY_SECONDS
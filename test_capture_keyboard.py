@@ -0,0 +1,55 @@
+"""
+Tests for the event buttons attached to /capture results
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from handlers.capture_command_handler import create_events_keyboard, cq_cancel_event
+
+
+def _extracted_events():
+    # Так повертає extract_events_from_text: події без id
+    return [
+        {"title": "Зустріч з командою", "date": "2025-01-15"},
+        {"title": "Дедлайн звіту", "date": "2025-01-20"},
+        {"title": "Дзвінок клієнту"},
+    ]
+
+
+def _callback_data(row):
+    return [button.callback_data for button in row]
+
+
+def test_keyboard_is_built_for_extracted_events():
+    keyboard = create_events_keyboard(_extracted_events())
+    assert keyboard is not None
+    assert len(keyboard.inline_keyboard) == 3
+
+
+def test_buttons_of_unsaved_events_are_keyed_by_card_number():
+    rows = create_events_keyboard(_extracted_events()).inline_keyboard
+    assert _callback_data(rows[1]) == ["event_add_n2", "event_edit_n2", "event_cancel_n2"]
+
+
+def test_saved_events_keep_their_id():
+    rows = create_events_keyboard([{"id": 42, "title": "Збережена"}]).inline_keyboard
+    assert _callback_data(rows[0]) == ["event_add_42", "event_edit_42", "event_cancel_42"]
+
+
+def test_no_events_means_no_keyboard():
+    assert create_events_keyboard([]) is None
+
+
+def test_cancel_removes_only_that_event_row():
+    callback = MagicMock()
+    callback.data = "event_cancel_n2"
+    callback.answer = AsyncMock()
+    callback.message.reply_markup = create_events_keyboard(_extracted_events())
+    callback.message.edit_reply_markup = AsyncMock()
+    callback.message.edit_text = AsyncMock()
+
+    asyncio.run(cq_cancel_event(callback))
+
+    markup = callback.message.edit_reply_markup.await_args.kwargs["reply_markup"]
+    assert [_callback_data(row)[2] for row in markup.inline_keyboard] == ["event_cancel_n1", "event_cancel_n3"]
+    callback.message.edit_text.assert_not_called()
@@ -0,0 +1,46 @@
+"""
+Tests for the Vercel OAuth callback page
+"""
+from types import SimpleNamespace
+
+from api.oauth_callback import handler
+
+
+def test_code_and_state_are_shown():
+    response = handler({"query": {"code": "abc", "state": "xyz"}})
+    assert response["statusCode"] == 200
+    assert "abc" in response["body"] and "xyz" in response["body"]
+
+
+def test_list_valued_query_uses_first_value():
+    # Так виглядає результат parse_qs: список значень на ключ
+    response = handler({"query": {"code": ["abc", "other"], "state": ["xyz"]}})
+    assert response["statusCode"] == 200
+    assert "<b>abc</b>" in response["body"]
+    assert "other" not in response["body"]
+
+
+def test_empty_list_counts_as_missing_code():
+    assert handler({"query": {"code": []}})["statusCode"] == 400
+
+
+def test_body_is_str_with_utf8_content_length():
+    response = handler({"query": {"code": "код"}})
+    assert isinstance(response["body"], str)
+    assert response["headers"]["Content-Length"] == str(len(response["body"].encode("utf-8")))
+
+
+def test_raw_query_string_is_parsed():
+    response = handler(SimpleNamespace(query_string=b"code=abc&state=xyz"))
+    assert response["statusCode"] == 200
+    assert "abc" in response["body"]
+
+
+def test_missing_code_and_oversized_query_get_distinct_pages():
+    missing = handler({"query": {}})
+    oversized = handler(SimpleNamespace(
+        query_string="&".join(f"f{i}=1" for i in range(50)) + "&code=abc"
+    ))
+    assert missing["statusCode"] == oversized["statusCode"] == 400
+    assert "No code provided" in missing["body"]
+    assert "Invalid request" in oversized["body"]